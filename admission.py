@@ -0,0 +1,114 @@
+import asyncio
+import math
+import time
+from scheduler import FairQueue, PRIORITY_NEW
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """Admits browser work up to the capacity the grid can really host.
+
+    capacity is an int or a callable re-evaluated on every decision. Work
+    beyond it waits in a FairQueue (by priority class, then fairly across
+    advisors) of at most max_queue entries, and anything past that is
+    rejected straight away with a retry-after hint.
+    Queued callers are told their position and an ETA derived from an
+    EWMA of how long admitted work has been taking, and once more with
+    position 0 when they are admitted. All methods run on the event loop.
+    """
+
+    def __init__(self, capacity, max_queue=20, service_time=180, smoothing=0.2, update_interval=5, weights=None):
+        self.capacity = capacity
+        self.max_queue = max_queue
+        self.service_time = service_time
+        self.smoothing = smoothing
+        self.update_interval = update_interval
+        self._running = 0
+        self._waiters = FairQueue(weights)
+
+    def current_capacity(self):
+        capacity = self.capacity() if callable(self.capacity) else self.capacity
+        return max(1, int(capacity))
+
+    def eta(self, position):
+        """Seconds until the caller at queue position (0 = next) should start."""
+        return math.ceil((position + 1) / self.current_capacity()) * self.service_time
+
+    def check(self):
+        """Raise AdmissionRejected now if a new caller would not fit in the queue."""
+        if self._running >= self.current_capacity() and len(self._waiters) >= self.max_queue:
+            raise AdmissionRejected(
+                f"Too many proposals in progress ({len(self._waiters)} waiting)",
+                retry_after=self.eta(len(self._waiters)),
+            )
+
+    async def acquire(self, on_queued=None, priority=PRIORITY_NEW, advisor=None):
+        if self._running < self.current_capacity() and not self._waiters:
+            self._running += 1
+            return
+        self.check()
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.push(future, priority, advisor)
+        last_position = None
+        try:
+            while True:
+                position = self._waiters.position(future) or 0
+                if on_queued and position != last_position:
+                    on_queued(position + 1, self.eta(position))
+                    last_position = position
+                try:
+                    await asyncio.wait_for(asyncio.shield(future), self.update_interval)
+                    if on_queued:
+                        on_queued(0, 0)
+                    return
+                except asyncio.TimeoutError:
+                    continue
+        except asyncio.CancelledError:
+            # Awaiting the shield leaves the future itself pending; cancel it
+            # so the queue skips it, unless it was granted a slot already
+            if future.done():
+                self._release_slot()
+            else:
+                future.cancel()
+            raise
+
+    def _release_slot(self):
+        self._running -= 1
+        self.wake()
+
+    def release(self, duration=None):
+        if duration is not None:
+            self.service_time = self.smoothing * duration + (1 - self.smoothing) * self.service_time
+        self._release_slot()
+
+    def wake(self):
+        """Admit waiters while there is room; call when capacity may have grown."""
+        while self._running < self.current_capacity():
+            future = self._waiters.pop()
+            if future is None:
+                return
+            self._running += 1
+            future.set_result(True)
+
+    async def run(self, work, on_queued=None, priority=PRIORITY_NEW, advisor=None):
+        """Await work() (a coroutine function) once admitted."""
+        await self.acquire(on_queued, priority, advisor)
+        start = time.monotonic()
+        try:
+            return await work()
+        finally:
+            self.release(time.monotonic() - start)
+
+    def status(self):
+        return {
+            "capacity": self.current_capacity(),
+            "running": self._running,
+            "queued": self._waiters.counts(),
+            "max_queue": self.max_queue,
+            "service_time": round(self.service_time, 1),
+        }
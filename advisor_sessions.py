@@ -0,0 +1,90 @@
+import hashlib
+import hmac
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+def credentials_digest(username, password):
+    return hashlib.sha256(f"{username}\0{password}".encode('utf-8')).hexdigest()
+
+
+class AdvisorSessionCache:
+    """Logged-in portal drivers parked between proposals, keyed by username.
+
+    A parked entry is handed out to one proposal at a time and only to a
+    caller presenting the same credentials that created it. Entries idle
+    for longer than idle_timeout, or beyond max_sessions, are passed to
+    close_driver (normally DriverPool.discard).
+    """
+
+    def __init__(self, close_driver, idle_timeout=600, max_sessions=8):
+        self.close_driver = close_driver
+        self.idle_timeout = idle_timeout
+        self.max_sessions = max_sessions
+        self._entries = OrderedDict()  # username -> entry, least recently parked first
+        self._lock = threading.Lock()
+
+    def park(self, username, digest, driver, proposal_url, portal_handle, proposal_handle):
+        """Park a logged-in driver; digest comes from credentials_digest()."""
+        entry = {
+            "driver": driver,
+            "digest": digest,
+            "proposal_url": proposal_url,
+            "portal_handle": portal_handle,
+            "proposal_handle": proposal_handle,
+            "parked_at": time.time(),
+        }
+        evicted = []
+        with self._lock:
+            previous = self._entries.pop(username, None)
+            if previous:
+                evicted.append(previous)
+            self._entries[username] = entry
+            while len(self._entries) > self.max_sessions:
+                evicted.append(self._entries.popitem(last=False)[1])
+        for old in evicted:
+            self._close(old)
+
+    def checkout(self, username, password):
+        """Take the parked session for this advisor, or None if there is none."""
+        with self._lock:
+            entry = self._entries.get(username)
+            if entry is None:
+                return None
+            if not hmac.compare_digest(entry["digest"], credentials_digest(username, password)):
+                return None
+            del self._entries[username]
+        if time.time() - entry["parked_at"] > self.idle_timeout:
+            self._close(entry)
+            return None
+        return entry
+
+    def expire(self):
+        """Close every session idle for longer than idle_timeout."""
+        cutoff = time.time() - self.idle_timeout
+        with self._lock:
+            expired = [username for username, entry in self._entries.items() if entry["parked_at"] < cutoff]
+            entries = [self._entries.pop(username) for username in expired]
+        for entry in entries:
+            self._close(entry)
+        return len(entries)
+
+    def close_all(self):
+        with self._lock:
+            entries = list(self._entries.values())
+            self._entries.clear()
+        for entry in entries:
+            self._close(entry)
+
+    def _close(self, entry):
+        try:
+            self.close_driver(entry["driver"])
+        except Exception as e:
+            logger.error(f"Failed to close advisor session: {str(e)}")
+
+    def __len__(self):
+        return len(self._entries)
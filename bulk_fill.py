@@ -0,0 +1,156 @@
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+
+# Entries locate their element by "id", "name" or "xpath".
+LOCATE_JS = """
+const locate = entry => entry.id ? document.getElementById(entry.id)
+    : entry.name ? document.getElementsByName(entry.name)[0]
+    : document.evaluate(entry.xpath, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+"""
+
+# Sets every input through the native value setter so React/Angular see a
+# real edit, then fires input/change/blur like a user typing and leaving
+# the field. Returns the keys of entries whose element was not found.
+BULK_FILL_SCRIPT = LOCATE_JS + """
+const entries = arguments[0];
+const setter = Object.getOwnPropertyDescriptor(HTMLInputElement.prototype, 'value').set;
+const missing = [];
+for (const entry of entries) {
+    const el = locate(entry);
+    if (!el) { missing.push(entry.id || entry.name || entry.xpath); continue; }
+    el.focus();
+    setter.call(el, entry.value);
+    el.dispatchEvent(new Event('input', {bubbles: true}));
+    el.dispatchEvent(new Event('change', {bubbles: true}));
+    el.dispatchEvent(new Event('blur', {bubbles: true}));
+    el.blur();
+}
+return missing;
+"""
+
+READ_BACK_SCRIPT = LOCATE_JS + """
+const entries = arguments[0];
+const values = {};
+for (const entry of entries) {
+    const el = locate(entry);
+    values[entry.id || entry.name || entry.xpath] = el ? el.value : null;
+}
+return values;
+"""
+
+# One DOM pass over the page in document order. Every Angular Material
+# input is reported with the text of its mat-label (from the label box in
+# front of its mat-form-field) and the index of the last "year/age" row
+# header seen before it. Row headers are divs whose own text is "n/n".
+MAP_MAT_INPUTS_SCRIPT = """
+const rowPattern = /^\\d+\\/\\d+$/;
+const ownText = el => Array.from(el.childNodes)
+    .filter(n => n.nodeType === Node.TEXT_NODE)
+    .map(n => n.textContent).join('').replace(/\\s+/g, ' ').trim();
+const rows = [];
+const inputs = [];
+const walker = document.createTreeWalker(document.body, NodeFilter.SHOW_ELEMENT);
+for (let el = walker.nextNode(); el; el = walker.nextNode()) {
+    if (el.tagName === 'DIV') {
+        const text = ownText(el);
+        if (rowPattern.test(text)) rows.push(text);
+    } else if (el.tagName === 'INPUT' && el.id.startsWith('mat-input-')) {
+        const field = el.closest('mat-form-field');
+        const box = field && field.previousElementSibling;
+        const label = box && box.classList.contains('mat-label-box') ? box.querySelector('mat-label') : null;
+        inputs.push({
+            id: el.id,
+            number: parseInt(el.id.slice('mat-input-'.length), 10),
+            label: label ? label.textContent.trim() : null,
+            numeric: el.getAttribute('inputmode') === 'numeric',
+            row: rows.length - 1,
+        });
+    }
+}
+return {rows: rows, inputs: inputs};
+"""
+
+
+def map_mat_inputs(driver):
+    """Map every mat-input on the page to its label and year/age row."""
+    return driver.execute_script(MAP_MAT_INPUTS_SCRIPT)
+
+
+def find_labelled_input(mapping, label):
+    """The first mat-input whose label reads exactly label, or None."""
+    return next((item for item in mapping["inputs"] if item["label"] == label), None)
+
+
+def first_input_after_row(mapping, row_text):
+    """The first numeric mat-input following the row header row_text, or None."""
+    if row_text not in mapping["rows"]:
+        return None
+    row_index = mapping["rows"].index(row_text)
+    return next(
+        (item for item in mapping["inputs"] if item["numeric"] and item["row"] >= row_index),
+        None,
+    )
+
+
+def _key(entry):
+    return entry.get("id") or entry.get("name") or entry.get("xpath")
+
+
+def _locator(entry):
+    if entry.get("id"):
+        return (By.ID, entry["id"])
+    if entry.get("name"):
+        return (By.NAME, entry["name"])
+    return (By.XPATH, entry["xpath"])
+
+
+def _normalize(value):
+    if value is None:
+        return None
+    value = str(value).replace(",", "").strip()
+    if "." in value:
+        value = value.rstrip("0").rstrip(".")
+    return value
+
+
+def bulk_fill(driver, entries):
+    """Fill all entries in one round trip; returns the keys that were not found."""
+    return driver.execute_script(BULK_FILL_SCRIPT, entries)
+
+
+def verify_filled(driver, entries):
+    """Read every entry back in one round trip; returns the entries that do not match."""
+    values = driver.execute_script(READ_BACK_SCRIPT, entries)
+    return [
+        entry for entry in entries
+        if _normalize(values.get(_key(entry))) != _normalize(entry["value"])
+    ]
+
+
+def fill_one(driver, entry, timeout=10):
+    """Slow path for a single entry: wait, clear and type like a user."""
+    input_element = WebDriverWait(driver, timeout).until(
+        EC.visibility_of_element_located(_locator(entry))
+    )
+    driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", input_element)
+    input_element.clear()
+    input_element.send_keys(str(entry["value"]))
+    return input_element
+
+
+def bulk_fill_verified(driver, entries, log_func):
+    """Bulk-fill entries, then retype any that did not take, one by one."""
+    if not entries:
+        return
+    missing = bulk_fill(driver, entries)
+    if missing:
+        log_func(f"批量填寫找不到 {len(missing)} 個欄位, 逐一填寫...")
+    mismatched = verify_filled(driver, entries)
+    for entry in mismatched:
+        fill_one(driver, entry)
+    if mismatched:
+        still_wrong = verify_filled(driver, mismatched)
+        if still_wrong:
+            raise ValueError(f"Failed to fill {', '.join(_key(e) for e in still_wrong)}")
+    log_func(f"批量填寫 {len(entries)} 個欄位完成 (逐一補填 {len(mismatched)} 個)")
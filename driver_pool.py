@@ -0,0 +1,195 @@
+import logging
+import threading
+import time
+from collections import deque
+from proxy_pool import is_proxy_error
+
+logger = logging.getLogger(__name__)
+
+
+class DriverPool:
+    """Pool of pre-launched WebDriver sessions.
+
+    create_driver() returns a ready driver plus a metadata dict (e.g. the
+    proxy it is bound to); close_driver(driver, meta) is called once the
+    driver has quit, with meta["failed"] set if it was given up on a
+    network error (see proxy_pool.is_proxy_error). Idle drivers are
+    health-checked before checkout and periodically while they wait, and a
+    driver is retired after max_uses checkouts or when it is discarded.
+    Callers set meta["signed_in"] once a driver has logged in somewhere; such
+    a driver is only recycled if every cookie of the browser can be wiped.
+    """
+
+    def __init__(self, create_driver, close_driver=None, size=2, max_uses=5,
+                 health_check_interval=60, warm_url=None):
+        self.create_driver = create_driver
+        self.close_driver = close_driver
+        self.size = size
+        self.max_uses = max_uses
+        self.health_check_interval = health_check_interval
+        self.warm_url = warm_url
+        self._idle = deque()  # drivers ready for checkout
+        self._meta = {}       # id(driver) -> {"meta", "uses", "created_at"}
+        self._warming = 0
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._maintenance = None
+
+    def start(self):
+        self._stopped.clear()
+        self._replenish()
+        if self.size and self._maintenance is None:
+            self._maintenance = threading.Thread(target=self._maintain, name="driver-pool", daemon=True)
+            self._maintenance.start()
+
+    def shutdown(self):
+        self._stopped.set()
+        with self._lock:
+            idle = list(self._idle)
+            self._idle.clear()
+        for driver in idle:
+            self._close(driver)
+
+    def meta(self, driver):
+        record = self._meta.get(id(driver))
+        return record["meta"] if record else {}
+
+    def _launch(self):
+        driver, meta = self.create_driver()
+        try:
+            driver.maximize_window()
+            if self.warm_url:
+                driver.get(self.warm_url)
+        except Exception as e:
+            if is_proxy_error(e):
+                meta["failed"] = True
+            self._close_raw(driver, meta)
+            raise
+        self._meta[id(driver)] = {"meta": meta, "uses": 0, "created_at": time.time()}
+        return driver
+
+    def _warm_one(self):
+        try:
+            driver = self._launch()
+        except Exception as e:
+            logger.error(f"Failed to pre-launch driver: {str(e)}")
+            driver = None
+        with self._lock:
+            self._warming -= 1
+            if driver is not None and not self._stopped.is_set():
+                self._idle.append(driver)
+                driver = None
+        if driver is not None:
+            self._close(driver)
+
+    def _replenish(self):
+        with self._lock:
+            missing = self.size - len(self._idle) - self._warming
+            if self._stopped.is_set() or missing <= 0:
+                return
+            self._warming += missing
+        for _ in range(missing):
+            threading.Thread(target=self._warm_one, name="driver-warm", daemon=True).start()
+
+    def _is_healthy(self, driver):
+        try:
+            driver.execute_script("return 1")
+            return True
+        except Exception:
+            return False
+
+    def _maintain(self):
+        while not self._stopped.wait(self.health_check_interval):
+            with self._lock:
+                idle = list(self._idle)
+            for driver in idle:
+                # Pinging also keeps the remote session from idling out
+                if not self._is_healthy(driver):
+                    with self._lock:
+                        if driver not in self._idle:
+                            continue
+                        self._idle.remove(driver)
+                    logger.info("Dropping unhealthy idle driver")
+                    self._close(driver)
+            self._replenish()
+
+    def acquire(self):
+        """Check out a warm driver, launching a cold one if none is ready."""
+        try:
+            while True:
+                with self._lock:
+                    driver = self._idle.popleft() if self._idle else None
+                if driver is None:
+                    return self._launch()
+                if self._is_healthy(driver):
+                    return driver
+                self._close(driver)
+        finally:
+            self._replenish()
+
+    def _reset(self, driver, signed_in=False):
+        """Wipe cookies and storage of every open window and keep one blank tab.
+
+        delete_all_cookies() only reaches the current document's domain, so
+        cookies set elsewhere (an SSO provider, say) are cleared over CDP.
+        A signed-in driver without CDP, such as a grid session, can't be
+        wiped fully and raises instead.
+        """
+        if hasattr(driver, "execute_cdp_cmd"):
+            driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+        elif signed_in:
+            raise RuntimeError("cookies of other domains cannot be cleared without CDP")
+        handles = driver.window_handles
+        for handle in handles:
+            driver.switch_to.window(handle)
+            driver.delete_all_cookies()
+            driver.execute_script("try { localStorage.clear(); sessionStorage.clear(); } catch (e) {}")
+        for handle in handles[1:]:
+            driver.switch_to.window(handle)
+            driver.close()
+        driver.switch_to.window(handles[0])
+        driver.get("about:blank")
+
+    def release(self, driver, healthy=True, error=None):
+        """Return a driver after use; it is recycled or retired as appropriate.
+
+        healthy=False retires the driver. error is the exception it was given
+        up on, if any; only a network error marks its proxy as failed.
+        """
+        record = self._meta.get(id(driver))
+        if record is None:
+            self._close(driver)
+            return
+        record["uses"] += 1
+        if error is not None and is_proxy_error(error):
+            record["meta"]["failed"] = True
+        if healthy and record["uses"] < self.max_uses and not self._stopped.is_set():
+            try:
+                self._reset(driver, record["meta"].get("signed_in", False))
+            except Exception as e:
+                logger.info(f"Driver reset failed, retiring it: {str(e)}")
+            else:
+                with self._lock:
+                    if len(self._idle) < self.size:
+                        self._idle.append(driver)
+                        return
+        self._close(driver)
+        self._replenish()
+
+    def discard(self, driver, error=None):
+        self.release(driver, healthy=False, error=error)
+
+    def _close(self, driver):
+        record = self._meta.pop(id(driver), None)
+        self._close_raw(driver, record["meta"] if record else {})
+
+    def _close_raw(self, driver, meta):
+        try:
+            driver.quit()
+        except Exception as e:
+            logger.info(f"Error quitting driver: {str(e)}")
+        if self.close_driver:
+            try:
+                self.close_driver(driver, meta)
+            except Exception as e:
+                logger.error(f"Driver close hook failed: {str(e)}")
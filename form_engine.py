@@ -0,0 +1,210 @@
+import glob
+import json
+import os
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import WebDriverException
+from sc_click import click_element
+from bulk_fill import bulk_fill_verified, verify_filled, fill_one
+
+FORMS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "forms")
+
+STEP_TYPES = ("click", "fill", "schedule")
+LOCATOR_KEYS = {"id": By.ID, "name": By.NAME, "xpath": By.XPATH}
+
+
+def withdrawal_schedule(form_data, calculation_data, log_func):
+    """Yearly withdrawals from the year after the premium term up to age 100.
+
+    Each row is {"year", "age", "value"}; amounts come from processedData
+    medicalPremium, converted with currencyRate for 美元 policies.
+    """
+    number_of_years = int(str(form_data['premiumPaymentPeriod']))
+    age_value = int(calculation_data['inputs'].get('age', ''))
+    start_year = number_of_years + 1
+    years = 100 - number_of_years - age_value
+    log_func(f"由(保單年度) = {start_year}")
+    log_func(f"提取期(年) = {years}")
+    sorted_data = sorted(calculation_data['processedData'], key=lambda x: x['yearNumber'])
+    start_index = next((i for i, item in enumerate(sorted_data) if item['yearNumber'] == start_year), None)
+    if start_index is None:
+        raise ValueError(f"Start year {start_year} not found in processedData")
+    currency_rate = float(calculation_data['inputs'].get('currencyRate', ''))
+    rows = []
+    for idx, entry in enumerate(sorted_data[start_index:start_index + years]):
+        premium = entry['medicalPremium']
+        if "美元" in form_data['currency']:
+            premium = round(premium / currency_rate, 0)
+        year = start_year + idx
+        rows.append({"year": year, "age": age_value + year, "value": str(int(premium))})
+    return rows
+
+
+# Named value derivations a form definition can refer to with "derive"
+DERIVATIONS = {
+    "withdrawal_schedule": withdrawal_schedule,
+}
+
+
+def resolve_path(path, form_data, calculation_data):
+    """Look up "formData.a", "calculation_data.a.b" or "inputs.a" in the request data."""
+    head, _, rest = path.partition(".")
+    roots = {
+        "formData": form_data,
+        "calculation_data": calculation_data,
+        "inputs": calculation_data.get('inputs', {}),
+    }
+    if head not in roots:
+        raise ValueError(f"Unknown value root '{head}' in '{path}'")
+    value = roots[head]
+    for part in rest.split(".") if rest else []:
+        value = value.get(part) if isinstance(value, dict) else None
+    return value
+
+
+def resolve_value(spec, form_data, calculation_data):
+    # "$formData.notionalAmount" reads request data; anything else is a literal
+    if isinstance(spec, str) and spec.startswith("$"):
+        value = resolve_path(spec[1:], form_data, calculation_data)
+    else:
+        value = spec
+    return "" if value is None else str(value)
+
+
+def condition_holds(condition, form_data, calculation_data):
+    if not condition:
+        return True
+    value = resolve_path(condition["path"], form_data, calculation_data)
+    if "contains" in condition:
+        return condition["contains"] in str(value)
+    if "equals" in condition:
+        return value == condition["equals"]
+    return bool(value)
+
+
+def _compile_step(step, form_name):
+    kind = step.get("type")
+    if kind not in STEP_TYPES:
+        raise ValueError(f"{form_name}: unknown step type {kind!r}")
+    locator = {key: step[key] for key in LOCATOR_KEYS if key in step}
+    if len(locator) != 1:
+        raise ValueError(f"{form_name}: {kind} step needs exactly one of {', '.join(LOCATOR_KEYS)}")
+    (key, selector), = locator.items()
+    compiled = {
+        "type": kind,
+        "locator_key": key,
+        "selector": selector,
+        "by": (LOCATOR_KEYS[key], selector),
+        "when": step.get("when"),
+        "log": step.get("log"),
+    }
+    if kind == "fill":
+        compiled["value"] = step["value"]
+    elif kind == "schedule":
+        if step.get("derive") not in DERIVATIONS:
+            raise ValueError(f"{form_name}: unknown derivation {step.get('derive')!r}")
+        compiled["derive"] = DERIVATIONS[step["derive"]]
+        compiled["timeout"] = step.get("timeout", 10)
+    return compiled
+
+
+def compile_form(definition):
+    """Validate a form definition and turn its steps into execution groups.
+
+    Consecutive fill steps are independent of each other, so they share one
+    group and are resolved, filled and verified together.
+    """
+    name = definition["name"]
+    groups = []
+    for step in definition["steps"]:
+        compiled = _compile_step(step, name)
+        if compiled["type"] == "fill" and groups and groups[-1][0]["type"] == "fill":
+            groups[-1].append(compiled)
+        else:
+            groups.append([compiled])
+    return {"name": name, "match": definition["match"], "groups": groups}
+
+
+def load_forms(directory=FORMS_DIR):
+    forms = []
+    for path in sorted(glob.glob(os.path.join(directory, "*.json"))):
+        with open(path, "r", encoding="utf-8") as f:
+            forms.append(compile_form(json.load(f)))
+    return forms
+
+
+FORMS = load_forms()
+
+
+def find_form(basic_plan, forms=None):
+    """The first form whose match strings all occur in the basic plan name."""
+    for form in FORMS if forms is None else forms:
+        if all(text in basic_plan for text in form["match"]):
+            return form
+    return None
+
+
+def _entry(step, selector, value):
+    return {step["locator_key"]: selector, "value": value}
+
+
+def _fill_entries(driver, entries, log_func, bulk):
+    # One read of every field; those already holding their value are left alone
+    pending = verify_filled(driver, entries)
+    if not pending:
+        return
+    if bulk:
+        try:
+            bulk_fill_verified(driver, pending, log_func)
+            return
+        except (ValueError, WebDriverException) as e:
+            log_func(f"批量填寫失敗, 改為逐一填寫: {str(e)}")
+            pending = verify_filled(driver, pending)
+    for entry in pending:
+        fill_one(driver, entry)
+
+
+def _run_fills(driver, steps, form_data, calculation_data, log_func, bulk):
+    entries = [
+        _entry(step, step["selector"], resolve_value(step["value"], form_data, calculation_data))
+        for step in steps
+    ]
+    _fill_entries(driver, entries, log_func, bulk)
+    for step in steps:
+        if step["log"]:
+            log_func(step["log"])
+
+
+def _run_schedule(driver, step, form_data, calculation_data, log_func, bulk):
+    rows = step["derive"](form_data, calculation_data, log_func)
+    entries = [_entry(step, step["selector"].format(**row), row["value"]) for row in rows]
+    if not entries:
+        return
+    # Schedule rows render together; wait once for the last one
+    WebDriverWait(driver, step["timeout"]).until(
+        EC.presence_of_element_located((step["by"][0], entries[-1][step["locator_key"]]))
+    )
+    _fill_entries(driver, entries, log_func, bulk)
+    if step["log"]:
+        for row in rows:
+            log_func(step["log"].format(**row))
+
+
+def run_form(driver, form, form_data, calculation_data, log_func, bulk=True):
+    """Execute a compiled form definition against the open proposal page.
+
+    Fields are bulk-filled and verified; if that still fails they are typed
+    one by one instead. bulk=False types every field one by one from the start.
+    """
+    for group in form["groups"]:
+        steps = [step for step in group if condition_holds(step["when"], form_data, calculation_data)]
+        if not steps:
+            continue
+        kind = steps[0]["type"]
+        if kind == "fill":
+            _run_fills(driver, steps, form_data, calculation_data, log_func, bulk)
+        elif kind == "schedule":
+            _run_schedule(driver, steps[0], form_data, calculation_data, log_func, bulk)
+        else:
+            click_element(driver, log_func, steps[0]["by"], steps[0]["log"] or f"{steps[0]['selector']} 已點選")
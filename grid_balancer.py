@@ -0,0 +1,176 @@
+import logging
+import threading
+import time
+import requests
+from selenium import webdriver
+
+logger = logging.getLogger(__name__)
+
+LOCAL_NODE = "local"
+ERROR_PENALTY = 30.0  # seconds of creation latency one unit of error rate counts as
+
+
+def fetch_grid_slots(executor_url, timeout=5):
+    """Total session slots on the grid's UP nodes, from its /status endpoint."""
+    response = requests.get(f"{executor_url.rstrip('/')}/status", timeout=timeout)
+    response.raise_for_status()
+    nodes = response.json()["value"].get("nodes", [])
+    return sum(len(node.get("slots", [])) for node in nodes if node.get("availability", "UP") == "UP")
+
+
+class GridNode:
+    def __init__(self, url, slots=1):
+        self.url = url
+        self.slots = slots
+        self.sessions = 0          # live drivers created here
+        self.latency = None        # EWMA of session creation seconds
+        self.error_rate = 0.0      # EWMA of creation failures (1) and successes (0)
+        self.consecutive_failures = 0
+        self.status_failures = 0   # /status polls failed in a row
+        self.drained_until = 0.0
+
+    def draining(self, now=None):
+        return (now or time.monotonic()) < self.drained_until
+
+    def score(self):
+        # Lower is better: slow, failing and busy nodes all get fewer
+        # sessions, and a node not tried yet goes first to be measured
+        latency = self.latency if self.latency is not None else 0.0
+        return (latency + ERROR_PENALTY * self.error_rate) * (1 + self.sessions / max(1, self.slots))
+
+    def snapshot(self):
+        return {
+            "url": self.url,
+            "slots": self.slots,
+            "sessions": self.sessions,
+            "latency": round(self.latency, 2) if self.latency is not None else None,
+            "error_rate": round(self.error_rate, 2),
+            "draining": self.draining(),
+        }
+
+
+class GridBalancer:
+    """Spreads new WebDriver sessions over several grid endpoints.
+
+    Each node tracks its live sessions, an EWMA of session creation latency
+    and of its error rate. New sessions go to the free node with the best
+    score, trying the others in turn when creation fails. A node is drained
+    for drain_seconds after max_failures session failures in a row, when its
+    error rate passes max_error_rate, or after max_status_failures /status
+    polls in a row fail or report no slots. With local_fallback, a local
+    Chrome is started when no node can take the session, and local_slots
+    count towards capacity.
+    """
+
+    def __init__(self, urls, local_fallback=False, local_slots=1, max_failures=3, max_error_rate=0.5,
+                 max_status_failures=3, drain_seconds=120, smoothing=0.3, status_timeout=5):
+        self.nodes = {url: GridNode(url) for url in urls}
+        self.local_fallback = local_fallback
+        self.local_slots = local_slots
+        self.max_status_failures = max_status_failures
+        self.max_failures = max_failures
+        self.max_error_rate = max_error_rate
+        self.drain_seconds = drain_seconds
+        self.smoothing = smoothing
+        self.status_timeout = status_timeout
+        self.local_sessions = 0
+        self._lock = threading.Lock()
+
+    def _candidates(self):
+        now = time.monotonic()
+        with self._lock:
+            live = [node for node in self.nodes.values() if not node.draining(now)]
+            free = [node for node in live if node.sessions < node.slots]
+            # A full grid still gets a session attempt, as the node queues it.
+            # With every node drained and nothing local to fall back on, a
+            # drained node is still better than failing outright
+            if not live and not self.local_fallback:
+                live = list(self.nodes.values())
+            return sorted(free or live, key=GridNode.score)
+
+    def _drain(self, node, reason):
+        # Called with the lock held
+        if not node.draining():
+            logger.warning(f"Draining grid node {node.url} for {self.drain_seconds}s: {reason}")
+        node.drained_until = time.monotonic() + self.drain_seconds
+
+    def _record(self, node, latency=None, failed=False):
+        with self._lock:
+            node.error_rate = self.smoothing * float(failed) + (1 - self.smoothing) * node.error_rate
+            if failed:
+                node.consecutive_failures += 1
+                if node.consecutive_failures >= self.max_failures:
+                    self._drain(node, f"{node.consecutive_failures} failures in a row")
+                elif node.error_rate > self.max_error_rate:
+                    self._drain(node, f"error rate {node.error_rate:.2f}")
+                return
+            node.consecutive_failures = 0
+            node.sessions += 1
+            node.latency = latency if node.latency is None else (
+                self.smoothing * latency + (1 - self.smoothing) * node.latency)
+
+    def create(self, options):
+        """Start a session; returns (driver, node url or LOCAL_NODE)."""
+        last_error = None
+        for node in self._candidates():
+            start = time.monotonic()
+            try:
+                driver = webdriver.Remote(command_executor=node.url, options=options)
+            except Exception as e:
+                logger.error(f"Session creation failed on {node.url}: {str(e)}")
+                self._record(node, failed=True)
+                last_error = e
+                continue
+            self._record(node, latency=time.monotonic() - start)
+            return driver, node.url
+        if self.local_fallback:
+            logger.warning("No grid node available, starting local Chrome")
+            driver = webdriver.Chrome(options=options)
+            with self._lock:
+                self.local_sessions += 1
+            return driver, LOCAL_NODE
+        raise last_error or RuntimeError("No grid node available")
+
+    def release(self, url):
+        """Account for a driver from create() having quit."""
+        with self._lock:
+            if url == LOCAL_NODE:
+                self.local_sessions = max(0, self.local_sessions - 1)
+            elif url in self.nodes:
+                self.nodes[url].sessions = max(0, self.nodes[url].sessions - 1)
+
+    def _status_failed(self, node, reason):
+        # Called with the lock held; one bad poll is not enough to drain a
+        # node that may still be creating sessions fine
+        node.status_failures += 1
+        if node.status_failures >= self.max_status_failures:
+            self._drain(node, f"{reason} ({node.status_failures} polls in a row)")
+
+    def refresh_status(self):
+        """Poll every node's /status; returns capacity() afterwards."""
+        for node in list(self.nodes.values()):
+            try:
+                slots = fetch_grid_slots(node.url, timeout=self.status_timeout)
+            except Exception as e:
+                with self._lock:
+                    self._status_failed(node, f"status check failed: {str(e)}")
+                continue
+            with self._lock:
+                if slots:
+                    node.slots = slots
+                    node.status_failures = 0
+                else:
+                    self._status_failed(node, "no slots up")
+        return self.capacity()
+
+    def capacity(self):
+        """Slots on nodes not draining, plus local_slots when local fallback is on."""
+        now = time.monotonic()
+        with self._lock:
+            remote = sum(node.slots for node in self.nodes.values() if not node.draining(now))
+        return remote + (self.local_slots if self.local_fallback else 0)
+
+    def status(self):
+        with self._lock:
+            nodes = [node.snapshot() for node in self.nodes.values()]
+            return {"nodes": nodes, "local_sessions": self.local_sessions}
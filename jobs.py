@@ -0,0 +1,83 @@
+import asyncio
+import time
+import uuid
+
+JOB_STATES = ("queued", "running", "done", "failed")
+
+
+class JobStore:
+    """Proposal jobs run in the background and polled by id.
+
+    A job's record holds its state, the result or error once finished (and
+    retry_after when the error carries one, e.g. AdmissionRejected), and
+    the asyncio task running it. Finished jobs are kept for ttl seconds so a
+    client that reconnects can still collect the result. At most one job
+    per session is active at a time.
+    """
+
+    def __init__(self, ttl=3600):
+        self.ttl = ttl
+        self._jobs = {}
+
+    def active_for_session(self, session_id):
+        return next(
+            (job for job in self._jobs.values()
+             if job["session_id"] == session_id and job["status"] in ("queued", "running")),
+            None,
+        )
+
+    def submit(self, kind, session_id, run, on_finish=None):
+        """Create a job and start run(job) (a coroutine function) on the event loop.
+
+        run may update the job record while it waits, e.g. its queue position.
+
+        on_finish(job) is called once the job is done or failed.
+        """
+        job = {
+            "job_id": str(uuid.uuid4()),
+            "kind": kind,
+            "session_id": session_id,
+            "status": "queued",
+            "result": None,
+            "error": None,
+            "retry_after": None,
+            "queue_position": None,
+            "eta_seconds": None,
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+        }
+        self._jobs[job["job_id"]] = job
+        job["task"] = asyncio.create_task(self._run(job, run, on_finish))
+        return job
+
+    async def _run(self, job, run, on_finish):
+        job["status"] = "running"
+        job["started_at"] = time.time()
+        try:
+            job["result"] = await run(job)
+            job["status"] = "done"
+        except Exception as e:
+            job["error"] = getattr(e, "detail", None) or str(e)
+            job["retry_after"] = getattr(e, "retry_after", None)
+            job["status"] = "failed"
+        finally:
+            job["finished_at"] = time.time()
+            job.pop("task", None)
+        if on_finish:
+            on_finish(job)
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def expire(self):
+        cutoff = time.time() - self.ttl
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job["finished_at"] is not None and job["finished_at"] < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+        return len(expired)
+
+    @staticmethod
+    def public(job):
+        return {key: value for key, value in job.items() if key != "task"}
@@ -0,0 +1,115 @@
+import asyncio
+import logging
+import random
+import time
+import httpx
+from openai import AsyncOpenAI, APIConnectionError, APITimeoutError, RateLimitError, InternalServerError
+
+logger = logging.getLogger(__name__)
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+RETRYABLE_ERRORS = (APIConnectionError, APITimeoutError, RateLimitError, InternalServerError, asyncio.TimeoutError)
+
+
+class LLMClient:
+    """Shared async chat-completion client for one OpenAI-compatible endpoint.
+
+    One pooled httpx connection (HTTP/2 when h2 is installed) serves every
+    call. Each call has an overall deadline covering all of its attempts;
+    connection errors, timeouts, 429s and 5xx responses are retried with
+    full-jitter exponential backoff. Responses are streamed, and on_delta
+    receives each piece of content as it arrives.
+    """
+
+    def __init__(self, api_key, base_url, model, deadline=120, max_attempts=3,
+                 backoff_base=1.0, backoff_max=10.0, max_connections=20):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.model = model
+        self.deadline = deadline
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_connections = max_connections
+        self._client = None
+
+    def _get_client(self):
+        if self._client is None:
+            http_client = httpx.AsyncClient(
+                http2=HTTP2_AVAILABLE,
+                limits=httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections),
+                timeout=httpx.Timeout(self.deadline, connect=10),
+            )
+            # Retries are handled here so they share the call's deadline
+            self._client = AsyncOpenAI(api_key=self.api_key, base_url=self.base_url,
+                                       http_client=http_client, max_retries=0)
+        return self._client
+
+    async def _stream(self, messages, on_delta):
+        stream = await self._get_client().chat.completions.create(
+            model=self.model,
+            messages=messages,
+            stream=True,
+            stream_options={"include_usage": True},
+        )
+        parts = []
+        usage = None
+        async for chunk in stream:
+            if chunk.usage is not None:
+                usage = chunk.usage
+            if not chunk.choices:
+                continue
+            content = chunk.choices[0].delta.content
+            if content:
+                parts.append(content)
+                if on_delta:
+                    on_delta(content)
+        return "".join(parts), usage
+
+    async def complete(self, messages, on_delta=None, deadline=None):
+        """Stream a completion; returns (text, usage, latency in seconds)."""
+        start = time.monotonic()
+        end = start + (deadline or self.deadline)
+        attempt = 0
+        while True:
+            attempt += 1
+            remaining = end - time.monotonic()
+            try:
+                text, usage = await asyncio.wait_for(self._stream(messages, on_delta), remaining)
+                return text, usage, time.monotonic() - start
+            except RETRYABLE_ERRORS as e:
+                delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1)))
+                if attempt >= self.max_attempts or time.monotonic() + delay >= end:
+                    raise
+                logger.info(f"LLM call failed ({type(e).__name__}), retry {attempt} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+
+
+class LineForwarder:
+    """Collects streamed text and hands each completed line to emit()."""
+
+    def __init__(self, emit):
+        self.emit = emit
+        self._buffer = ""
+
+    def __call__(self, delta):
+        self._buffer += delta
+        *lines, self._buffer = self._buffer.split("\n")
+        for line in lines:
+            if line.strip():
+                self.emit(line)
+
+    def flush(self):
+        if self._buffer.strip():
+            self.emit(self._buffer)
+        self._buffer = ""
@@ -5,6 +5,7 @@ from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import NoSuchElementException, TimeoutException, ElementClickInterceptedException
 from selenium.webdriver.common.keys import Keys
 from sc_click import sc_click
+from bulk_fill import bulk_fill_verified, map_mat_inputs, find_labelled_input, first_input_after_row
 
 def fill_LV_form(driver, form_data, calculation_data, log_func, TIMEOUT=120):
     def get_medical_premium(processed_data, start_year_number):
@@ -321,53 +322,16 @@ def fill_LV_form(driver, form_data, calculation_data, log_func, TIMEOUT=120):
     log_func(f"由(歲數) = {startAge}")
     numberOfWithDrawYear = str(100 - int(startAge))
     log_func(f"提取期(年) = {numberOfWithDrawYear}")
-    base_num = 0
-    
-    
-   
-    
-    for start_id in ['16', '27', '32']:
-        input_id = f"mat-input-{start_id}"
-        try:
-            input_field = WebDriverWait(driver, 3).until(
-                EC.presence_of_element_located((By.ID, input_id))
-            )
-            label = input_field.find_element(
-                By.XPATH,
-                ".//ancestor::mat-form-field/preceding-sibling::div[@class='mat-label-box']/mat-label"
-            )
-            if label.text.strip() == '由(歲數)':
-                base_num = start_id
-                from_year_field = WebDriverWait(driver, 3).until(
-                    EC.visibility_of_element_located((By.ID, f"{input_id}")))
-                from_year_field.send_keys(startAge)
-                log_func(f"由(歲數) 已填(16/27) base_num = {str(base_num)}")
-                break
-        except TimeoutException:
-            log_func(f"ID mat-input-{input_id} 未找到，嘗試下一個...")
-            continue
-
-    if base_num is 0:
-        for i in range(13, 40):
-            input_id = f"mat-input-{i}"
-            try:
-                print(f"Tring input_id = {input_id}")
-                input_field = WebDriverWait(driver, 3).until(
-                    EC.presence_of_element_located((By.ID, input_id))
-                )
-                label = input_field.find_element(
-                    By.XPATH,
-                    ".//ancestor::mat-form-field/preceding-sibling::div[@class='mat-label-box']/mat-label"
-                )
-                if label.text.strip() == '由(歲數)':
-                    base_num = i
-                    from_year_field = WebDriverWait(driver, 3).until(
-                        EC.visibility_of_element_located((By.ID, f"{input_id}")))
-                    from_year_field.send_keys(startAge)
-                    log_func(f"由(歲數) 已填 base_num{str(base_num)}")
-                    break
-            except Exception:
-                continue
+    # Map every mat-input to its label in one pass instead of probing ids
+    try:
+        from_year_input = WebDriverWait(driver, 20, poll_frequency=0.25).until(
+            lambda d: find_labelled_input(map_mat_inputs(d), '由(歲數)')
+        )
+    except TimeoutException:
+        log_func("由(歲數) 輸入欄未找到")
+        raise
+    base_num = from_year_input['number']
+    log_func(f"由(歲數) 輸入欄 base_num = {str(base_num)}")
 
     field_ids = {
         'takeout_year': f"mat-input-{int(base_num) + 1}",
@@ -375,34 +339,22 @@ def fill_LV_form(driver, form_data, calculation_data, log_func, TIMEOUT=120):
         'inflation': f"mat-input-{int(base_num) + 3}"
     }
 
-    
-    takeout_year_field = WebDriverWait(driver, TIMEOUT).until(
-        EC.visibility_of_element_located((By.ID, field_ids['takeout_year'])))
-    takeout_year_field.clear()
-    takeout_year_field.send_keys(numberOfWithDrawYear)
-    log_func(f"提取年期 已填 with ID {field_ids['takeout_year']}")
-
-    every_year_amount_field = WebDriverWait(driver, TIMEOUT).until(
-        EC.visibility_of_element_located((By.ID, field_ids['every_year_amount'])))
-    every_year_amount_field.clear()
+    header_entries = [
+        {"id": from_year_input['id'], "value": startAge},
+        {"id": field_ids['takeout_year'], "value": numberOfWithDrawYear},
+    ]
     if not form_data['useInflation']:
-        every_year_amount_field.send_keys('1000')
+        header_entries.append({"id": field_ids['every_year_amount'], "value": '1000'})
     else:
         premium = get_medical_premium(calculation_data['processedData'], startYearNumber)
         if "美元" in form_data['currency']:
             currency_rate = float(calculation_data['inputs'].get('currencyRate', ''))
             premium = round(premium / currency_rate, 0)
-        every_year_amount_field.send_keys(str(int(premium)))
-    log_func(f"每年提取金額 已填 with ID {field_ids['every_year_amount']}")
-
-    if form_data['useInflation']:
+        header_entries.append({"id": field_ids['every_year_amount'], "value": str(int(premium))})
         inflation_rate = str(calculation_data['inputs'].get('inflationRate', ''))
-        inflation_field = WebDriverWait(driver, TIMEOUT).until(
-            EC.visibility_of_element_located((By.ID, field_ids['inflation']))
-        )
-        inflation_field.clear()
-        inflation_field.send_keys(inflation_rate)
-        log_func(f"通貨膨脹率 已填 with ID {field_ids['inflation']}")
+        header_entries.append({"id": field_ids['inflation'], "value": inflation_rate})
+    bulk_fill_verified(driver, header_entries, log_func)
+    log_func(f"由(歲數)/提取年期/每年提取金額 已填 with ID {', '.join(e['id'] for e in header_entries)}")
 
     enter_button = WebDriverWait(driver, TIMEOUT).until(
         EC.presence_of_element_located((By.XPATH, "//span[text()='加入']"))
@@ -410,66 +362,40 @@ def fill_LV_form(driver, form_data, calculation_data, log_func, TIMEOUT=120):
     driver.execute_script("arguments[0].click();", enter_button)
     log_func("加入 已點選, 請稍後...")
 
-    time.sleep(3)
+    start_year_str = str(number_of_years)
+    search_age_str = str(startAge)
+    row_text = f"{start_year_str}/{search_age_str}"
+    print(f"保單年度終結/歲數 = {row_text}")
     try:
-        # print("startYearNumber", startYearNumber)
-        # age = int(calculation_data['inputs'].get('age', ''))
-        # print("age", age)
-        # searchAge = int(startYearNumber) + age
-        # print("searchAge", searchAge)
-
-        start_year_str = str(number_of_years)
-        search_age_str = str(startAge)
-        
-        print(f"保單年度終結/歲數 = {start_year_str}/{search_age_str}")
-        input_element = driver.find_element(
-            By.XPATH,
-            f"//div[normalize-space(text())='{start_year_str}/{search_age_str}']/following::input[starts-with(@id, 'mat-input-') and @inputmode='numeric']"
+        # Wait for the withdrawal table instead of a fixed sleep
+        anchor = WebDriverWait(driver, 20, poll_frequency=0.25).until(
+            lambda d: first_input_after_row(map_mat_inputs(d), row_text)
         )
-        input_id = input_element.get_attribute("id")
-        print("input_id_1:", input_id)
-
-        id = int(input_id.split('-')[-1])
-        print("input_id_2:", str(id))
-
-        id = id + 3
-        print("input_id_3:", str(id))
-
-        log_func(f"元素的 ID 是 {id}")
-
-    except Exception as e:
-        print(f"Error finding input element: {e}")
-        log_func(f"Error finding input element: {e}")
+    except TimeoutException:
+        log_func(f"Error finding input element: row {row_text} not found")
         raise
+    id = anchor['number'] + 3
+    log_func(f"元素的 ID 是 {id}")
 
     if not form_data['useInflation']:
         sorted_data = sorted(calculation_data['processedData'], key=lambda x: x['yearNumber'])
         
         start_index = next((i for i, item in enumerate(sorted_data) if item['yearNumber'] == int(startYearNumber)), None)
-        # print(f"start_index={start_index}")
         if start_index is None:
             raise ValueError(f"Start year {startYearNumber} not found in processedData")
         end_index = start_index + int(numberOfWithDrawYear)
-        # print(f"end_index={end_index}")
         withdrawal_data = sorted_data[start_index:end_index]
-        # print(f"withdrawal_data={withdrawal_data}")
         currency_rate = float(calculation_data['inputs'].get('currencyRate', ''))
 
+        entries = []
+        filled_messages = []
         for idx, entry in enumerate(withdrawal_data):
-            # print(f"idx={idx}")
-            # print(f"entry={entry}")
             premium = entry['medicalPremium']
-            # print(f"premium={premium}")
             if "美元" in form_data['currency']:
                 premium = round(premium / currency_rate, 0)
             input_index = id + (idx * 4)
-            xpath = f'//*[@id="mat-input-{input_index}"]'
-            input_field = WebDriverWait(driver, 20).until(
-                EC.visibility_of_element_located((By.XPATH, xpath))
-            )
-            input_field.clear()
-            input_field.send_keys(str(int(premium)))
-            inputed_id = input_field.get_attribute("id")
-            log_func(f"已填 {str(int(start_year_str)+idx)}/{str(int(search_age_str)+idx)}({premium}) in field index = {input_index} and inputed_id = {inputed_id}")
-            time.sleep(0.2)
-        
\ No newline at end of file
+            entries.append({"id": f"mat-input-{input_index}", "value": str(int(premium))})
+            filled_messages.append(f"已填 {str(int(start_year_str)+idx)}/{str(int(search_age_str)+idx)}({premium}) in field index = {input_index}")
+        bulk_fill_verified(driver, entries, log_func)
+        for message in filled_messages:
+            log_func(message)
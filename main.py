@@ -1,18 +1,13 @@
 # before proxy
-import requests
-import io
-import pdfplumber
-from openai import OpenAI
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import StreamingResponse, JSONResponse
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from pydantic import BaseModel
 from urllib.parse import urljoin
-from pdfminer.high_level import extract_text
 import uuid
 import asyncio
 from concurrent.futures import ThreadPoolExecutor
@@ -32,12 +27,30 @@ from dotenv import load_dotenv
 import shutil
 import re
 from selenium.webdriver.common.keys import Keys
-from trst import fill_TRST_form
 from lv import fill_LV_form
 from sc_click import sc_click
 from sc_click_By_Name import sc_click_By_Name
+from form_engine import find_form, run_form
+from pdf_extract import page_texts, find_termination_year, find_basic_premium, extract_proposal, build_ai_context
+from surrender_values import parse_surrender_summary, lookup_cash_values
+from llm_client import LLMClient, LineForwarder
+from result_cache import ResultCache, pdf_digest
+from portal_http import PortalHttpClient
+from jobs import JobStore
+from admission import AdmissionController, AdmissionRejected
+from grid_balancer import GridBalancer
+from session_registry import open_registry
+from worker_routing import WorkerRouter, serve_worker_socket, worker_socket_path
+from scheduler import FairScheduler, PRIORITY_NAMES, PRIORITY_RETRY, PRIORITY_NEW
+from plan_store import PlanStore
+from plan_catalog import PlanCatalog
+from projection import project_premium_schedule
+from driver_pool import DriverPool
+from advisor_sessions import AdvisorSessionCache, credentials_digest
+from proxy_pool import ProxyPool, is_proxy_error
 import pytz
-import queue
+import hashlib
+import socket
 
 load_dotenv()
 DEEPSEEK_API_KEY = os.getenv("DEEPSEEK_API_KEY")
@@ -57,28 +70,95 @@ UseGrok = True
 app = FastAPI()
 executor = ThreadPoolExecutor(max_workers=32)
 
+# Proposal work shares the executor by priority (retry > new > batch) and
+# fairly across advisors; ADVISOR_WEIGHTS is a JSON map of username to
+# share. Threads beyond SCHEDULER_THREADS stay free for housekeeping
+advisor_weights = json.loads(os.getenv("ADVISOR_WEIGHTS", "{}"))
+scheduler = FairScheduler(executor, int(os.getenv("SCHEDULER_THREADS", "28")), advisor_weights)
+
+# PDF extraction and AI results keyed by the PDF's sha256; PDF_CACHE_DIR
+# adds an on-disk tier that survives restarts
+pdf_cache = ResultCache(
+    max_entries=int(os.getenv("PDF_CACHE_SIZE", "64")),
+    disk_dir=os.getenv("PDF_CACHE_DIR") or None,
+)
+
+# One pooled async client for all AI calls; AI_DEADLINE bounds each call
+# including its retries
+AI_DEADLINE = float(os.getenv("AI_DEADLINE", "120"))
+if UseGrok:
+    llm_client = LLMClient(GROK2_API_KEY, "https://api.x.ai/v1", "grok-3", deadline=AI_DEADLINE)
+else:
+    llm_client = LLMClient(DEEPSEEK_API_KEY, "https://api.deepseek.com", "deepseek-reasoner", deadline=AI_DEADLINE)
+
+@app.on_event("shutdown")
+async def close_llm_client():
+    await llm_client.aclose()
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
 
-# Load IPs from ip.json into a thread-safe queue
+# Premium tables under plans/ are served from memory and hot reloaded on change
+plan_store = PlanStore("plans")
+plan_catalog = PlanCatalog()
+PLAN_RELOAD_INTERVAL = float(os.getenv("PLAN_RELOAD_INTERVAL", "5"))
+
+@app.on_event("startup")
+async def load_plan_tables():
+    count = await run_in_thread(plan_store.load_all)
+    plan_catalog.rebuild(plan_store)
+    logger.info(f"Loaded {count} plan files ({len(plan_store)} tables)")
+    asyncio.create_task(watch_plan_tables())
+
+async def watch_plan_tables():
+    while True:
+        await asyncio.sleep(PLAN_RELOAD_INTERVAL)
+        try:
+            reloaded = await run_in_thread(plan_store.refresh)
+            if reloaded:
+                plan_catalog.rebuild(plan_store)
+                logger.info(f"Reloaded {reloaded} plan files")
+        except Exception as e:
+            logger.error(f"Plan reload failed: {str(e)}")
+
+# Load IPs from ip.json into a health-scored proxy pool
 with open('ip.json', 'r') as f:
     ip_data = json.load(f)
     ip_list = [f"{item['ip']}:{item['port']}" for item in ip_data['data']]
 
-ip_queue = queue.Queue()
-for ip_port in ip_list:
-    ip_queue.put(ip_port)
+proxy_pool = ProxyPool(
+    ip_list,
+    quarantine_after=int(os.getenv("PROXY_QUARANTINE_AFTER", "3")),
+    quarantine_seconds=float(os.getenv("PROXY_QUARANTINE_SECONDS", "300")),
+)
+PROXY_LEASE_TIMEOUT = float(os.getenv("PROXY_LEASE_TIMEOUT", "60"))
+
+@app.on_event("startup")
+async def start_proxy_pool():
+    if IsProduction:
+        proxy_pool.start()
+
+@app.on_event("shutdown")
+async def stop_proxy_pool():
+    proxy_pool.stop()
+
+@app.get("/proxies")
+async def get_proxies():
+    return proxy_pool.status()
 
 # Define Pydantic models
 class CalculationData(BaseModel):
-    processedData: List[Dict]
+    # processedData may be left empty when inputs name the plan
+    # (company, planFileName, planOption); it is then built server-side
+    processedData: List[Dict] = []
     inputs: Dict
-    totalAccumulatedMP: float
+    totalAccumulatedMP: float = 0
 
 class CashValueInfo(BaseModel):
     age_1: int
@@ -122,10 +202,90 @@ class RetryRequest(BaseModel):
 # Global storage
 sessions = {}  # session_id -> {"driver": driver, "form_data": form_data}
 session_queues = {}  # session_id -> asyncio.Queue
+
+# Which worker owns each session's driver and log queue. SESSION_REGISTRY is
+# "memory" for a single worker or "sqlite:///path" shared by the workers of
+# one host (hypercorn --workers); a request for a session owned by another
+# worker is forwarded there. Sessions are not shared between replicas. Each
+# worker needs an address only it answers on: left unset, WORKER_URL is a
+# unix socket per worker under WORKER_SOCKET_DIR, else a per-worker port.
+# WORKER_ID is host:pid, so entries left by another host are told apart
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+SESSION_REGISTRY = os.getenv("SESSION_REGISTRY", "memory")
+SESSION_REGISTRY_TTL = float(os.getenv("SESSION_REGISTRY_TTL", "7200"))
+WORKER_HEARTBEAT = float(os.getenv("WORKER_HEARTBEAT", "30"))
+WORKER_SOCKET = None
+WORKER_URL = os.getenv("WORKER_URL")
+if not WORKER_URL:
+    if SESSION_REGISTRY == "memory":
+        WORKER_URL = f"http://{socket.gethostname()}:{os.getenv('PORT', '8000')}"
+    else:
+        WORKER_SOCKET_DIR = os.getenv("WORKER_SOCKET_DIR") or os.path.join(tempfile.gettempdir(), "prudential-workers")
+        os.makedirs(WORKER_SOCKET_DIR, exist_ok=True)
+        WORKER_SOCKET = worker_socket_path(WORKER_SOCKET_DIR, WORKER_ID)
+        WORKER_URL = f"unix:{WORKER_SOCKET}"
+worker_router = WorkerRouter(
+    open_registry(SESSION_REGISTRY),
+    WORKER_ID,
+    WORKER_URL,
+    timeout=float(os.getenv("FORWARD_TIMEOUT", "600")),
+)
+worker_shutdown = asyncio.Event()
+
+async def session_owner(http_request: Request, session_id: str):
+    """Address of the worker owning session_id, or None when it is served here."""
+    if session_id in session_queues:
+        return None
+    return await worker_router.owner_address(http_request, session_id)
+
+async def release_if_finished(session_id: str):
+    # A session whose queue was dropped is over; stop routing it here
+    if session_id not in session_queues:
+        await worker_router.release(session_id)
+
+@app.on_event("startup")
+async def start_worker_routing():
+    if SESSION_REGISTRY == "memory":
+        return
+    if WORKER_SOCKET:
+        asyncio.create_task(serve_worker_socket(app, WORKER_SOCKET, worker_shutdown))
+    else:
+        await worker_router.check_address(WORKER_HEARTBEAT * 3)
+    asyncio.create_task(worker_heartbeat())
+
+async def worker_heartbeat():
+    while True:
+        try:
+            await worker_router.claim(f"worker:{WORKER_URL}")
+        except Exception as e:
+            logger.error(f"Worker heartbeat failed: {str(e)}")
+        await asyncio.sleep(WORKER_HEARTBEAT)
+
+@app.on_event("startup")
+async def start_session_registry_reaper():
+    asyncio.create_task(expire_session_registry())
+
+async def expire_session_registry():
+    while True:
+        await asyncio.sleep(300)
+        try:
+            await run_in_thread(worker_router.registry.expire, SESSION_REGISTRY_TTL)
+        except Exception as e:
+            logger.error(f"Session registry expiry failed: {str(e)}")
+
+@app.on_event("shutdown")
+async def close_worker_router():
+    worker_shutdown.set()
+    if SESSION_REGISTRY != "memory":
+        await worker_router.release(f"worker:{WORKER_URL}")
+    await worker_router.aclose()
 TIMEOUT = 120
 
-# Helper function to run synchronous tasks in a thread
-async def run_in_thread(func, *args):
+# Helper function to run synchronous tasks in a thread; proposal work passes
+# a priority (and the advisor) to be scheduled, housekeeping runs directly
+async def run_in_thread(func, *args, priority=None, advisor=None):
+    if priority is not None:
+        return await scheduler.run(func, *args, priority=priority, advisor=advisor)
     loop = asyncio.get_event_loop()
     return await loop.run_in_executor(executor, func, *args)
 
@@ -141,7 +301,10 @@ class TerminateSessionRequest(BaseModel):
     session_id: str
     
 @app.post("/terminate-session")
-async def terminate_session(request: TerminateSessionRequest):
+async def terminate_session(request: TerminateSessionRequest, http_request: Request):
+    owner = await session_owner(http_request, request.session_id)
+    if owner:
+        return await worker_router.forward(http_request, request.session_id, owner)
     print(f"Received terminate request for session: {request.session_id}")
     print("Current sessions:", list(sessions.keys()))
     
@@ -154,13 +317,16 @@ async def terminate_session(request: TerminateSessionRequest):
             try:
                 # Optional: Check driver state (e.g., current URL)
                 print("Driver current URL before quit:", driver.current_url)
-                driver.quit()
-                print(f"Driver quit successfully for session {request.session_id}")
+                drop_portal_http(driver)
+                await run_in_thread(driver_pool.release, driver)
+                print(f"Driver released successfully for session {request.session_id}")
             except Exception as e:
                 print(f"Error quitting driver for session {request.session_id}: {type(e).__name__} - {str(e)}")
+                await run_in_thread(driver_pool.discard, driver)
             finally:
                 sessions.pop(request.session_id, None)
                 session_queues.pop(request.session_id, None)
+                await worker_router.release(request.session_id)
                 print(f"Cleaned up session {request.session_id}")
                 return {"status": "terminated"}
         else:
@@ -176,136 +342,333 @@ async def init_session():
     session_id = str(uuid.uuid4())
     queue = asyncio.Queue()
     session_queues[session_id] = queue
+    await worker_router.claim(session_id)
     return {"session_id": session_id}
 
-# Selenium worker for initial login and form filling
-def selenium_worker(session_id: str, url: str, username: str, password: str, calculation_data: Dict, cashValueInfo: Dict, formData: Dict, queue: asyncio.Queue, loop: asyncio.AbstractEventLoop):
-    try:
-        options = webdriver.ChromeOptions()
-        options.add_argument('--no-sandbox')
-        options.add_argument('--disable-dev-shm-usage')
-        options.add_argument("--disable-gpu")
-        
-        # options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+# WebDriver endpoints new sessions are spread over, as a comma separated
+# GRID_URLS; LOCAL_CHROME_FALLBACK=1 starts a local Chrome when no node
+# can take a session
+GRID_URLS = [url.strip() for url in os.getenv(
+    "GRID_URLS", "https://standalone-chrome-production-57ca.up.railway.app").split(",") if url.strip()]
+grid = GridBalancer(
+    GRID_URLS,
+    local_fallback=os.getenv("LOCAL_CHROME_FALLBACK") == "1",
+    local_slots=int(os.getenv("LOCAL_CHROME_SLOTS", "1")),
+    max_failures=int(os.getenv("GRID_MAX_FAILURES", "3")),
+    drain_seconds=float(os.getenv("GRID_DRAIN_SECONDS", "120")),
+)
+
+# Launch a configured Chrome session; DriverPool keeps a few of these warm
+def create_driver():
+    options = webdriver.ChromeOptions()
+    options.add_argument('--no-sandbox')
+    options.add_argument('--disable-dev-shm-usage')
+    options.add_argument("--disable-gpu")
+    
+    # options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+    
+    # options.add_argument('--headless')
+    prefs = {
+        "download.prompt_for_download": False,
+        "plugins.always_open_pdf_externally": False,
+        "profile.managed_default_content_settings.images": 2
+    }
+    options.add_experimental_option("prefs", prefs)
+
+    meta = {}
+    if IsProduction:
+        options.add_argument('--headless')
+        ip_port = proxy_pool.lease(timeout=PROXY_LEASE_TIMEOUT)
+        print("ip=",ip_port)
+        meta["ip_port"] = ip_port
         
-        # options.add_argument('--headless')
-        prefs = {
-            "download.prompt_for_download": False,
-            "plugins.always_open_pdf_externally": False,
-            "profile.managed_default_content_settings.images": 2
-        }
-        options.add_experimental_option("prefs", prefs)
+        options.add_argument(f"--proxy-server=http://{ip_port}")
+        try:
+            driver, meta["grid_node"] = grid.create(options)
+        except Exception as e:
+            proxy_pool.release(ip_port, ok=not is_proxy_error(e))
+            raise
+    else:
+        # options.add_argument("--proxy-server=http://43.163.8.134:11837")
+        # driver = webdriver.Remote(command_executor='https://standalone-chrome-production-57ca.up.railway.app', options=options)
+        # driver = webdriver.Remote(command_executor='https://selenium-chrome-app.fly.dev', options=options)
+        # driver = webdriver.Remote(command_executor='http://216.250.97.169:4444', options=options)
+        driver = webdriver.Chrome(options=options)
+    return driver, meta
 
-        if IsProduction:
-            options.add_argument('--headless')
-            ip_port = ip_queue.get()
-            print("ip=",ip_port)
-            sessions[session_id] = {"ip_port": ip_port}
-            
-            options.add_argument(f"--proxy-server=http://{ip_port}")
-            driver = webdriver.Remote(command_executor='https://standalone-chrome-production-57ca.up.railway.app', options=options)
-            # driver = webdriver.Remote(command_executor='https://standalone-chrome.railway.internal', options=options)
-            # driver = webdriver.Remote(command_executor='http://216.250.97.169:4444', options=options)
-        else:
-            # options.add_argument("--proxy-server=http://43.163.8.134:11837")
-            # driver = webdriver.Remote(command_executor='https://standalone-chrome-production-57ca.up.railway.app', options=options)
-            # driver = webdriver.Remote(command_executor='https://selenium-chrome-app.fly.dev', options=options)
-            # driver = webdriver.Remote(command_executor='http://216.250.97.169:4444', options=options)
-            driver = webdriver.Chrome(options=options)
-            
-        driver.maximize_window() 
-        # print("there")
-        driver.get(url)
-        # print("here")
-        def log_func(message):
-            log_message(message, queue, loop)
-       
-        # Initialize session dictionary and set start time
-        sessions[session_id] = {}
-        start_time = time.time()
-        sessions[session_id]['start_time'] = start_time
+# The proxy goes back to the pool and the grid node gets its slot back once
+# the driver bound to them is gone
+def close_driver(driver, meta):
+    if meta.get("grid_node"):
+        grid.release(meta["grid_node"])
+    if meta.get("http"):
+        meta["http"].close()
+    if meta.get("ip_port"):
+        proxy_pool.release(meta["ip_port"], ok=not meta.get("failed"))
 
-        # Perform initial clicks
-        sc_click(driver, log_func, '/html/body/div/header/div[1]/div[1]/div[1]/a[3]', '登入已點選')
-        sc_click(driver, log_func, '/html/body/div/header/div[1]/div[5]/div/div[2]/div/a[2]', '理財顧問已點選')
+# HTTP client sharing a driver's portal login, kept for the driver's lifetime
+PDF_DOWNLOAD_TIMEOUT = float(os.getenv("PDF_DOWNLOAD_TIMEOUT", "60"))
 
-        # Get all window handles and switch to the new tab
-        all_handles = driver.window_handles
-        new_tab_handle = all_handles[-1]
-        driver.switch_to.window(new_tab_handle)
+def portal_http(driver):
+    meta = driver_pool.meta(driver)
+    if "http" not in meta:
+        meta["http"] = PortalHttpClient(timeout=PDF_DOWNLOAD_TIMEOUT)
+    return meta["http"]
 
-        # Enter username and password
-        login_field = WebDriverWait(driver, TIMEOUT).until(
-            EC.presence_of_element_located((By.NAME, "username"))
-        )
-        login_field.send_keys(username)
-        log_func("使用者名稱已填寫")
+# A driver going back to the pool may serve another advisor next; it gets a
+# fresh client rather than one that carried the previous advisor's login
+def drop_portal_http(driver):
+    client = driver_pool.meta(driver).pop("http", None)
+    if client:
+        client.close()
 
-        login_field = WebDriverWait(driver, TIMEOUT).until(
-            EC.visibility_of_element_located((By.NAME, "password"))
-        )
-        login_field.send_keys(password)
-        log_func("密碼已填寫")
+driver_pool = DriverPool(
+    create_driver,
+    close_driver,
+    size=int(os.getenv("DRIVER_POOL_SIZE", "2" if IsProduction else "0")),
+    max_uses=int(os.getenv("DRIVER_MAX_USES", "5")),
+    warm_url=os.getenv("DRIVER_WARM_URL"),
+)
 
-        # Submit the form
-        sc_click(driver, log_func, '//*[@id="submit"]', '提交已點選')
-        
+@app.on_event("startup")
+async def start_driver_pool():
+    driver_pool.start()
+
+# Logged-in portal sessions kept per advisor between proposals. Keep the
+# idle timeout under the Selenium grid's session timeout (300s by default)
+advisor_sessions = AdvisorSessionCache(
+    driver_pool.discard,
+    idle_timeout=float(os.getenv("ADVISOR_SESSION_IDLE", "240")),
+    max_sessions=int(os.getenv("ADVISOR_SESSION_MAX", "4")),
+)
+
+@app.on_event("startup")
+async def start_advisor_session_reaper():
+    asyncio.create_task(expire_advisor_sessions())
+
+async def expire_advisor_sessions():
+    while True:
+        await asyncio.sleep(30)
         try:
-            log_func("等待PRUForce...")
-            # Wait for the div with class "title" to be present (up to 10 seconds)
-            wait = WebDriverWait(driver, 3)
-            title_div = wait.until(EC.presence_of_element_located((By.CLASS_NAME, "title")))
-            
-            # Get the text content of the div
-            title_text = title_div.text
-            log_func(f"標題為'{title_text}'")
-            # Check if the text contains "請持續使用"
-            if "請持續使用" in title_text:
-                log_func("請先登入PRUForce")
-                driver.quit()
-                raise RuntimeError('請先登入PRUForce')
-
-        except TimeoutException:
-            log_func("沒有PRUForce, 繼續...")
+            expired = await run_in_thread(advisor_sessions.expire)
+            if expired:
+                logger.info(f"Closed {expired} idle advisor sessions")
         except Exception as e:
-            print(f"An error occurred: {e}")
-            driver.quit()
-            raise 
+            logger.error(f"Advisor session expiry failed: {str(e)}")
 
+@app.on_event("shutdown")
+async def stop_driver_pool():
+    await run_in_thread(advisor_sessions.close_all)
+    await run_in_thread(driver_pool.shutdown)
 
-        
-        time.sleep(2)
+# Admission control in front of selenium_worker. Browser slots are the sum
+# over healthy grid nodes' /status (BROWSER_SLOTS until the first poll); browsers kept
+# warm in the pool, held by sessions awaiting a retry or parked for an
+# advisor are not free for new logins
+browser_slots = int(os.getenv("BROWSER_SLOTS", "4"))
+GRID_STATUS_INTERVAL = float(os.getenv("GRID_STATUS_INTERVAL", "30"))
 
-        # Perform additional clicks
-        sc_click(driver, log_func, '//*[@id="wrapper"]/div[2]/div/ul/li[1]/div/span', '營銷系統已點選')
+def login_capacity():
+    # Executor threads add and drop sessions meanwhile; iterate over a copy
+    held = sum(1 for session_data in list(sessions.values()) if "driver" in session_data)
+    return browser_slots - driver_pool.size - held - len(advisor_sessions)
 
-        # Capture current window handles before the click that opens the new window
-        current_handles = driver.window_handles
+admission = AdmissionController(
+    login_capacity,
+    max_queue=int(os.getenv("ADMISSION_MAX_QUEUE", "20")),
+    service_time=float(os.getenv("ADMISSION_SERVICE_TIME", "180")),
+    weights=advisor_weights,
+)
 
-        # Perform the click that opens the new window
-        sc_click(driver, log_func, '//*[@id="wrapper"]/div[2]/div/ul/li[1]/ul/li[11]/div/span', '建議書系統已點選')
-        
-        # Wait for the new window to open
-        WebDriverWait(driver, TIMEOUT).until(
-            lambda d: len(d.window_handles) > len(current_handles)
+@app.on_event("startup")
+async def start_grid_status_poller():
+    if IsProduction:
+        asyncio.create_task(poll_grid_status())
+
+async def poll_grid_status():
+    global browser_slots
+    while True:
+        try:
+            slots = await run_in_thread(grid.refresh_status)
+            # On a total outage keep the last known count; admission would
+            # otherwise shrink to one slot and stay there until polls recover
+            if slots and slots != browser_slots:
+                logger.info(f"Browser grid has {slots} healthy slots")
+                browser_slots = slots
+                admission.wake()
+        except Exception as e:
+            logger.error(f"Grid status poll failed: {str(e)}")
+        await asyncio.sleep(GRID_STATUS_INTERVAL)
+
+@app.get("/admission")
+async def admission_status():
+    return {**admission.status(), "threads": scheduler.status(), "grid": grid.status()}
+
+# Hand a driver back after a finished proposal: park it logged in for the
+# advisor's next proposal when possible, otherwise wipe it into the pool
+def finish_with_driver(driver, session_data: Dict):
+    portal = session_data.get("portal")
+    if portal and session_data.get("username"):
+        advisor_sessions.park(
+            session_data["username"],
+            session_data["credentials"],
+            driver,
+            portal["proposal_url"],
+            portal["portal_handle"],
+            portal["proposal_handle"],
         )
+    else:
+        drop_portal_http(driver)
+        driver_pool.release(driver)
 
-        # Get all window handles again
-        all_handles = driver.window_handles
+# Log in from the public site and open the 建議書系統 window
+def portal_login(driver, url: str, username: str, password: str, log_func):
+    # The portal's SSO cookies span several domains; see DriverPool._reset
+    driver_pool.meta(driver)["signed_in"] = True
+    load_start = time.time()
+    driver.get(url)
+    ip_port = driver_pool.meta(driver).get("ip_port")
+    if ip_port:
+        proxy_pool.report(ip_port, latency=time.time() - load_start)
 
-        # Find the new window handle
-        new_handle = [handle for handle in all_handles if handle not in current_handles][0]
+    # Perform initial clicks
+    sc_click(driver, log_func, '/html/body/div/header/div[1]/div[1]/div[1]/a[3]', '登入已點選')
+    sc_click(driver, log_func, '/html/body/div/header/div[1]/div[5]/div/div[2]/div/a[2]', '理財顧問已點選')
 
-        # Switch to the new window
-        driver.switch_to.window(new_handle)
+    # Get all window handles and switch to the new tab
+    all_handles = driver.window_handles
+    new_tab_handle = all_handles[-1]
+    driver.switch_to.window(new_tab_handle)
+
+    # Enter username and password
+    login_field = WebDriverWait(driver, TIMEOUT).until(
+        EC.presence_of_element_located((By.NAME, "username"))
+    )
+    login_field.send_keys(username)
+    log_func("使用者名稱已填寫")
+
+    login_field = WebDriverWait(driver, TIMEOUT).until(
+        EC.visibility_of_element_located((By.NAME, "password"))
+    )
+    login_field.send_keys(password)
+    log_func("密碼已填寫")
+
+    # Submit the form
+    sc_click(driver, log_func, '//*[@id="submit"]', '提交已點選')
+    
+    try:
+        log_func("等待PRUForce...")
+        # Wait for the div with class "title" to be present (up to 10 seconds)
+        wait = WebDriverWait(driver, 3)
+        title_div = wait.until(EC.presence_of_element_located((By.CLASS_NAME, "title")))
         
-        # Wait for the button to be clickable and click it
-        button = WebDriverWait(driver, TIMEOUT).until(
-            EC.element_to_be_clickable((By.XPATH, "/html/body/div[2]/div[3]/div/div[3]/div[2]/div/div[1]/button"))
-        )
-        button.click()
-        log_func("確認 已點選 開始制作建議書打")
-        driver.maximize_window() 
+        # Get the text content of the div
+        title_text = title_div.text
+        log_func(f"標題為'{title_text}'")
+        # Check if the text contains "請持續使用"
+        if "請持續使用" in title_text:
+            log_func("請先登入PRUForce")
+            raise RuntimeError('請先登入PRUForce')
+
+    except TimeoutException:
+        log_func("沒有PRUForce, 繼續...")
+    except Exception as e:
+        print(f"An error occurred: {e}")
+        raise 
+
+
+    
+    time.sleep(2)
+
+    # Perform additional clicks
+    sc_click(driver, log_func, '//*[@id="wrapper"]/div[2]/div/ul/li[1]/div/span', '營銷系統已點選')
+
+    # Capture current window handles before the click that opens the new window
+    current_handles = driver.window_handles
+
+    # Perform the click that opens the new window
+    sc_click(driver, log_func, '//*[@id="wrapper"]/div[2]/div/ul/li[1]/ul/li[11]/div/span', '建議書系統已點選')
+    
+    # Wait for the new window to open
+    WebDriverWait(driver, TIMEOUT).until(
+        lambda d: len(d.window_handles) > len(current_handles)
+    )
+
+    # Get all window handles again
+    all_handles = driver.window_handles
+
+    # Find the new window handle
+    new_handle = [handle for handle in all_handles if handle not in current_handles][0]
+
+    # Switch to the new window
+    driver.switch_to.window(new_handle)
+    return {
+        "portal_handle": new_tab_handle,
+        "proposal_handle": new_handle,
+        "proposal_url": driver.current_url,
+    }
+
+# Reopen the 建議書系統 landing page in an already logged-in driver
+def resume_portal_session(driver, parked: Dict, log_func):
+    keep = {parked["portal_handle"], parked["proposal_handle"]}
+    for handle in driver.window_handles:
+        if handle not in keep:
+            driver.switch_to.window(handle)
+            driver.close()
+    driver.switch_to.window(parked["proposal_handle"])
+    driver.get(parked["proposal_url"])
+    log_func("沿用已登入的建議書系統")
+    return {
+        "portal_handle": parked["portal_handle"],
+        "proposal_handle": parked["proposal_handle"],
+        "proposal_url": parked["proposal_url"],
+    }
+
+def start_new_proposal(driver, log_func, timeout=TIMEOUT):
+    # Wait for the button to be clickable and click it
+    button = WebDriverWait(driver, timeout).until(
+        EC.element_to_be_clickable((By.XPATH, "/html/body/div[2]/div[3]/div/div[3]/div[2]/div/div[1]/button"))
+    )
+    button.click()
+    log_func("確認 已點選 開始制作建議書打")
+    driver.maximize_window() 
+
+# Selenium worker for initial login and form filling
+def selenium_worker(session_id: str, url: str, username: str, password: str, calculation_data: Dict, cashValueInfo: Dict, formData: Dict, queue: asyncio.Queue, loop: asyncio.AbstractEventLoop):
+    def log_func(message):
+        log_message(message, queue, loop)
+
+    driver = None
+    try:
+        # Initialize session dictionary and set start time
+        start_time = time.time()
+        sessions[session_id] = {'start_time': start_time}
+
+        portal = None
+        parked = advisor_sessions.checkout(username, password)
+        if parked:
+            driver = parked["driver"]
+            try:
+                portal = resume_portal_session(driver, parked, log_func)
+                start_new_proposal(driver, log_func, timeout=15)
+            except Exception as e:
+                log_func("已登入的連線無法沿用, 重新登入...")
+                print(f"Advisor session resume failed: {str(e)}")
+                driver_pool.discard(driver, e)
+                driver = None
+                portal = None
+
+        if portal is None:
+            driver = driver_pool.acquire()
+            portal = portal_login(driver, url, username, password, log_func)
+            start_new_proposal(driver, log_func)
+
+        sessions[session_id].update({
+            "ip_port": driver_pool.meta(driver).get("ip_port"),
+            "username": username,
+            "credentials": credentials_digest(username, password),
+            "portal": portal,
+        })
         
         # Fill out basic information
         sureName_field = WebDriverWait(driver, TIMEOUT).until(
@@ -370,16 +733,17 @@ def selenium_worker(session_id: str, url: str, username: str, password: str, cal
         basicPlan_ = str(formData['basicPlan'])
         log_func(f"基本計劃 = {basicPlan_}")    
         
-        if 'TRST' in basicPlan_:
-            fill_TRST_form(driver, formData, calculation_data, log_func, TIMEOUT=120)
-        # else 'ESG ' in basicPlan_:     
-        #     fill_esg_form(driver, formData, calculation_data, log_func, TIMEOUT=120)
+        # Plan-specific steps come from the matching definition in forms/
+        plan_form = find_form(basicPlan_)
+        if plan_form:
+            run_form(driver, plan_form, formData, calculation_data, log_func)
+        else:
+            log_func(f"沒有 {basicPlan_} 的表格定義")
             
         # Perform checkout
         result = perform_checkout(driver, formData['notionalAmount'], formData, log_func, calculation_data, cashValueInfo, session_id)
         if result["status"] == "success":
-            driver.quit()
-            sessions.pop(session_id, None)
+            finish_with_driver(driver, sessions.pop(session_id, {}))
             session_queues.pop(session_id, None)
             return result
         elif result["status"] == "retry":
@@ -394,12 +758,131 @@ def selenium_worker(session_id: str, url: str, username: str, password: str, cal
 
     except Exception as e:
         log_func(f"Selenium error: {str(e)}")
-        if session_id in sessions:
-            driver = sessions.pop(session_id).get("driver")
-            if driver:
-                driver.quit()
+        sessions.pop(session_id, None)
+        if driver:
+            driver_pool.discard(driver, e)
         raise
 
+# Extraction and parsed surrender table of a proposal PDF, cached by content
+def load_proposal(pdf_bytes: bytes, digest: Optional[str] = None):
+    digest = digest or pdf_digest(pdf_bytes)
+    key = f"proposal:{digest}"
+    record = pdf_cache.get(key)
+    if record is None:
+        extraction = extract_proposal(pdf_bytes)
+        table = parse_surrender_summary(pdf_bytes, extraction["summary_pages"])
+        record = {"extraction": extraction, "table": table}
+        pdf_cache.put(key, record)
+    else:
+        logger.info(f"Proposal PDF {digest[:12]} served from cache")
+    # The disk tier hands back JSON object keys as strings
+    extraction = dict(record["extraction"], pages={int(k): v for k, v in record["extraction"]["pages"].items()})
+    table = {int(k): v for k, v in record["table"].items()}
+    return digest, extraction, table
+
+def preview_termination_year(pdf_bytes: bytes, digest: Optional[str] = None):
+    key = f"termination:{digest or pdf_digest(pdf_bytes)}"
+    record = pdf_cache.get(key)
+    if record is None:
+        # Only the termination sentence matters here, so a text search suffices
+        record = {"year": find_termination_year(page_texts(pdf_bytes))}
+        pdf_cache.put(key, record)
+    return record["year"]
+
+def ai_result_key(digest: str, age_1, age_2, currency_rate: float):
+    return f"ai:{digest}:{age_1}:{age_2}:{currency_rate}"
+
+# Prompt for the annual premium and the two surrender values (all HKD);
+# only used when the surrender-value table cannot be parsed from the PDF
+def build_ai_messages(text: str, age_1, age_2, policy_ending_year_1: int, policy_ending_year_2: int, currency_rate: float):
+    system_prompt = (
+        f"首先幫我在第1頁的資料表中找出第一項基本計劃的投保時每年保費的數值"
+        f"如果找到的數值是美元,就要使用{currency_rate}匯率轉為港元, 答案就顯示美元及港元 **USDxxxxxx** 及 **HKDxxxxxx**"
+        f"再幫我在「基本計劃 – 退保價值之説明摘要 」表格中找出第{str(policy_ending_year_1)}保單周年終結和第{str(policy_ending_year_2)}保單年度終結的 現金提取後退保價值總額 (A)+(B)+(C)的數值,"
+        f"如果找到的數值是美元,就要使用{currency_rate}匯率轉為港元, 答案就顯示美元及港元"
+        f"答案要儘量簡單直接輸出兩句, 不要隔行:'{str(age_1)}歲 或 第{policy_ending_year_1}保單年度終結的「現金提取後退保價值總是 **USDxxxxxx** 及 **HKDxxxxxx**'"
+        f"'{str(age_2)}歲 或 第{policy_ending_year_2}保單年度終結的「現金提取後退保價值總是 **USDxxxxxx** 及 **HKDxxxxxx**',"
+        "答案要使用點格式"
+        "數值前面要加上2個*號及HKD, 更加要有','作為貨幣模式"
+        "最后答案用要講出答案是從哪一頁找到"
+    )
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": text}
+    ]
+    return messages
+
+# Runs on the event loop, streaming the reply to the session's log as it arrives
+async def ai_cash_values(messages: List[Dict], log_func):
+    log_func(f"AI 解讀計劃書中, 請稍後...")
+    log_func(f"AI模型=X" if UseGrok else f"AI模型C使用中")
+    forward = LineForwarder(lambda line: log_func(f"AI 回覆 : {line}"))
+    try:
+        ai_response, usage, latency = await llm_client.complete(messages, on_delta=forward)
+    except Exception as e:
+        # The proposal PDF is already made and its session gone, so a failed
+        # AI call degrades to zero values like an unparseable reply does
+        logger.error(f"AI call failed: {type(e).__name__}: {str(e)}")
+        log_func(f"AI 解讀失敗: {str(e) or type(e).__name__}")
+        return 0, 0, 0
+    forward.flush()
+    prompt_tokens = usage.prompt_tokens if usage else None
+    completion_tokens = usage.completion_tokens if usage else None
+    logger.info(
+        f"AI call model={llm_client.model} prompt_chars={len(messages[-1]['content'])} prompt_tokens={prompt_tokens} "
+        f"completion_tokens={completion_tokens} latency={latency:.1f}s"
+    )
+    log_func(f"AI 用時 {latency:.1f}秒, tokens: 輸入={prompt_tokens} 輸出={completion_tokens}")
+    
+    pattern = r'(?:HK?D?|K)\s*(\d[\d,]*)' 
+    matches = re.findall(pattern, ai_response)
+    
+    if len(matches) >= 3:
+        annual_premium =   int(matches[0].replace(',', ''))
+        age_1_cash_value = int(matches[1].replace(',', ''))
+        age_2_cash_value = int(matches[2].replace(',', ''))
+    else:
+        log_func("未能從AI回應中提取足夠的HKD值")
+        annual_premium = 0
+        age_1_cash_value = 0
+        age_2_cash_value = 0
+    return annual_premium, age_1_cash_value, age_2_cash_value
+
+def log_checkout_summary(result: Dict, details: Dict, log_func):
+    log_func(f"投保時每年保費={result['annual_premium']}HKD")
+    log_func(f"{details['age_1']}歲 或 第{details['policy_ending_year_1']}保單年度終結的退保價值總額={result['age_1_cash_value']}HKD")
+    log_func(f"{details['age_2']}歲 或 第{details['policy_ending_year_2']}保單年度終結的退保價值總額{result['age_2_cash_value']}HKD")
+    
+    # Calculate and log elapsed time
+    elapsed_time = time.time() - details['start_time']
+    minutes, seconds = divmod(elapsed_time, 60)
+    timer_value = f"{int(minutes):02d}:{int(seconds):02d}"
+    log_func(f"v1.0 所需時間 = {timer_value}")    
+        
+    log_func("建議書已成功建立及下載到計劃書系統中!")
+
+# A successful checkout whose values still need the LLM carries an
+# "ai_request"; the endpoint finishes it here after the driver is released
+async def complete_checkout(result: Dict, log_func):
+    ai_request = result.pop("ai_request", None)
+    if ai_request is None:
+        return result
+    cached = pdf_cache.get(ai_request["cache_key"])
+    if cached is not None:
+        log_func("使用之前的AI解讀結果")
+        annual_premium, age_1_cash_value, age_2_cash_value = cached
+    else:
+        annual_premium, age_1_cash_value, age_2_cash_value = await ai_cash_values(ai_request["messages"], log_func)
+        if annual_premium or age_1_cash_value or age_2_cash_value:
+            pdf_cache.put(ai_request["cache_key"], [annual_premium, age_1_cash_value, age_2_cash_value])
+    result.update({
+        "annual_premium": annual_premium,
+        "age_1_cash_value": age_1_cash_value,
+        "age_2_cash_value": age_2_cash_value,
+    })
+    log_checkout_summary(result, ai_request["details"], log_func)
+    return result
+
 # Helper function to perform checkout and capture PDF from network
 def perform_checkout(driver, notional_amount: str, form_data: Dict, log_func, calculation_data: Dict, cash_value_info: Dict, session_id: str):
     age_value = calculation_data['inputs'].get('age', '')
@@ -460,34 +943,21 @@ def perform_checkout(driver, notional_amount: str, form_data: Dict, log_func, ca
             current_url = driver.current_url
             pdf_full_url = urljoin(current_url, pdf_relative_url)
             
-            # Get the current cookies from the Selenium driver
-            cookies = driver.get_cookies()
-            session = requests.Session()
-            for cookie in cookies:
-                session.cookies.set(cookie['name'], cookie['value'])
-            headers = {"Referer": current_url}
-            response = session.get(pdf_full_url, headers=headers)
-            response.raise_for_status()
-            pdf_bytes = response.content
-            pdf_file = io.BytesIO(pdf_bytes)
-            text = extract_text(pdf_file)
+            # Download with the browser's cookies over its keep-alive session
+            pdf_bytes, digest = portal_http(driver).download(driver, pdf_full_url, referer=current_url)
+            number = preview_termination_year(pdf_bytes, digest)
             tz_gmt8 = pytz.timezone("Asia/Shanghai")
             timestamp = datetime.now(tz_gmt8).strftime("%Y%m%d%H%M")
             filename = f"{basicPlan_}_{timestamp}"
             pdf_base64 = base64.b64encode(pdf_bytes).decode('utf-8')
-            pattern = r"由於所有保單值已被提取，本保單將於第\d+保單年度終結時終止。"
-            matches = re.findall(pattern, text)
-            for match in matches:
-                year_match = re.search(r'第(\d+)保單年度', match)
-                if year_match:
-                    number = int(year_match.group(1))  
-                    ending_age = int(age_value) + number
-                    return {
-                        "status": "retry",
-                        "system_message": f"由於所有保單值已被提取，本保單將於第{number}保單年度(第{ending_age}歲)終止 \n 對上一次輸入的名義金額為${formatted_amount}",
-                        "pdf_base64": pdf_base64,
-                        "filename": filename + ".pdf"
-                    }
+            if number is not None:
+                ending_age = int(age_value) + number
+                return {
+                    "status": "retry",
+                    "system_message": f"由於所有保單值已被提取，本保單將於第{number}保單年度(第{ending_age}歲)終止 \n 對上一次輸入的名義金額為${formatted_amount}",
+                    "pdf_base64": pdf_base64,
+                    "filename": filename + ".pdf"
+                }
             
             sc_click(driver, log_func, "//div[div/h5='保費及徵費 -']//button", '核對 已點選')
             
@@ -519,26 +989,23 @@ def perform_checkout(driver, notional_amount: str, form_data: Dict, log_func, ca
             all_handles = driver.window_handles
             pdf_base64 = None
             pdf_window_handle = None
+            extraction = None
             for handle in all_handles:
                 if handle != original_window:
                     driver.switch_to.window(handle)
                     current_url = driver.current_url
                     if current_url.endswith(".pdf"):
                         pdf_window_handle = handle
-                        # Extract PDF using requests
-                        cookies = driver.get_cookies()
-                        session = requests.Session()
-                        for cookie in cookies:
-                            session.cookies.set(cookie['name'], cookie['value'])
-                        headers = {"Referer": current_url}
-                        response = session.get(current_url, headers=headers)
-                        response.raise_for_status()
-                        pdf_bytes = response.content
-                        pdf_file = io.BytesIO(pdf_bytes)
-                        text = extract_text(pdf_file)
+                        # Same connection and cookie jar as the preview download
+                        pdf_bytes, digest = portal_http(driver).download(driver, current_url, referer=current_url)
+                        # Parse page 1 and the surrender-value summary only
+                        digest, extraction, table = load_proposal(pdf_bytes, digest)
                         pdf_base64 = base64.b64encode(pdf_bytes).decode('utf-8')
                         log_func("從PDF檔案中提取文本內容")
                         break
+            if extraction is None:
+                # No 建議書 window with a PDF; read the preview PDF instead
+                digest, extraction, table = load_proposal(pdf_bytes, digest)
             
             age_1 = cash_value_info['age_1']
             age_2 = cash_value_info['age_2']
@@ -552,86 +1019,49 @@ def perform_checkout(driver, notional_amount: str, form_data: Dict, log_func, ca
             log_func(f"基本儲蓄計劃是={basicPlan_}")
             
             currency_rate = float(calculation_data['inputs'].get('currencyRate', ''))
-            age_1_cash_value = 0
-            age_2_cash_value = 0
-            annual_premium = 0
-            
-            system_prompt = (
-                f"首先幫我在第1頁的資料表中找出第一項基本計劃的投保時每年保費的數值"
-                f"如果找到的數值是美元,就要使用{currency_rate}匯率轉為港元, 答案就顯示美元及港元 **USDxxxxxx** 及 **HKDxxxxxx**"
-                f"再幫我在「基本計劃 – 退保價值之説明摘要 」表格中找出第{str(policy_ending_year_1)}保單周年終結和第{str(policy_ending_year_2)}保單年度終結的 現金提取後退保價值總額 (A)+(B)+(C)的數值,"
-                f"如果找到的數值是美元,就要使用{currency_rate}匯率轉為港元, 答案就顯示美元及港元"
-                f"答案要儘量簡單直接輸出兩句, 不要隔行:'{str(age_1)}歲 或 第{policy_ending_year_1}保單年度終結的「現金提取後退保價值總是 **USDxxxxxx** 及 **HKDxxxxxx**'"
-                f"'{str(age_2)}歲 或 第{policy_ending_year_2}保單年度終結的「現金提取後退保價值總是 **USDxxxxxx** 及 **HKDxxxxxx**',"
-                "答案要使用點格式"
-                "數值前面要加上2個*號及HKD, 更加要有','作為貨幣模式"
-                "最后答案用要講出答案是從哪一頁找到"
+            usd_policy = "美元" in form_data['currency']
+            cash_values = lookup_cash_values(
+                table, [policy_ending_year_1, policy_ending_year_2], currency_rate if usd_policy else None
             )
-            messages = [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": text}
-            ]
-            log_func(f"AI 解讀計劃書中, 請稍後...")
-            
-            if UseGrok:
-                api_key = GROK2_API_KEY
-                base_url="https://api.x.ai/v1"
-                model = "grok-3"
-                log_func(f"AI模型=X")
-            else: 
-                api_key = DEEPSEEK_API_KEY   
-                base_url="https://api.deepseek.com"
-                model = "deepseek-reasoner"
-                log_func(f"AI模型C使用中")
-                
-            client = OpenAI(api_key=api_key, base_url=base_url)
-            response = client.chat.completions.create(
-                model=model,
-                messages=messages,
-            )
-            ai_response = response.choices[0].message.content
-            
-            # print("currency_rate",currency_rate)
-            # print("ai_response",ai_response)
-            pattern = r'(?:HK?D?|K)\s*(\d[\d,]*)' 
-            matches = re.findall(pattern, ai_response)
-            
-            if len(matches) >= 3:
-                annual_premium =   int(matches[0].replace(',', ''))
-                age_1_cash_value = int(matches[1].replace(',', ''))
-                age_2_cash_value = int(matches[2].replace(',', ''))
-            else:
-                log_func("未能從AI回應中提取足夠的HKD值")
-                annual_premium = 0
-                age_1_cash_value = 0
-                age_2_cash_value = 0
-                
-            log_func(f"投保時每年保費={annual_premium}HKD")
-            log_func(f"{age_1}歲 或 第{policy_ending_year_1}保單年度終結的退保價值總額={age_1_cash_value}HKD")
-            log_func(f"{age_2}歲 或 第{policy_ending_year_2}保單年度終結的退保價值總額{age_2_cash_value}HKD")
-            
-            lines = ai_response.splitlines()
-            for line in lines:
-                log_func(f"AI 回覆 : {line}")
-                
-            # Calculate and log elapsed time
-            end_time = time.time()
-            start_time = sessions[session_id]['start_time']
-            elapsed_time = end_time - start_time
-            minutes, seconds = divmod(elapsed_time, 60)
-            timer_value = f"{int(minutes):02d}:{int(seconds):02d}"
-            log_func(f"v1.0 所需時間 = {timer_value}")    
-                
-            log_func("建議書已成功建立及下載到計劃書系統中!")
-            
-            return {
+            details = {
+                "age_1": age_1,
+                "age_2": age_2,
+                "policy_ending_year_1": policy_ending_year_1,
+                "policy_ending_year_2": policy_ending_year_2,
+                "start_time": sessions[session_id]['start_time'],
+            }
+            result = {
                 "status": "success",
-                "age_1_cash_value": age_1_cash_value,
-                "age_2_cash_value": age_2_cash_value,
-                "annual_premium": annual_premium,
+                "age_1_cash_value": 0,
+                "age_2_cash_value": 0,
+                "annual_premium": 0,
                 "pdf_base64": pdf_base64,
                 "filename": filename + ".pdf"
             }
+            if cash_values is None:
+                log_func("未能從建議書表格讀取退保價值, 改用AI解讀")
+                result["ai_request"] = {
+                    "messages": build_ai_messages(
+                        build_ai_context(extraction, [policy_ending_year_1, policy_ending_year_2]),
+                        age_1, age_2, policy_ending_year_1, policy_ending_year_2, currency_rate
+                    ),
+                    "details": details,
+                    "cache_key": ai_result_key(digest, age_1, age_2, currency_rate),
+                }
+                return result
+            
+            result["age_1_cash_value"], result["age_2_cash_value"] = cash_values
+            # The basic plan's premium, as the AI path reports it; the 保費及徵費
+            # panel also counts the levy and any riders
+            basic_premium = find_basic_premium(extraction["pages"].get(0, ""))
+            if basic_premium is not None:
+                result["annual_premium"] = int(round(basic_premium * (currency_rate if usd_policy else 1)))
+            else:
+                log_func("未能從建議書第1頁讀取基本計劃保費, 改用保費及徵費總額")
+                result["annual_premium"] = int(round(float(annual_hkd.replace(',', ''))))
+            log_func("已從建議書表格讀取退保價值")
+            log_checkout_summary(result, details, log_func)
+            return result
 
     except TimeoutException as e:
         log_func(f"Error: {str(e)}")
@@ -678,85 +1108,219 @@ def retry_notional_worker(session_id: str, new_notional_amount: str, queue: asyn
         result = perform_checkout(driver, new_notional_amount, form_data, log_func, calculation_data, cash_value_info, session_id)
         
         if result["status"] == "success":
-            driver.quit()
-            sessions.pop(session_id, None)
+            finish_with_driver(driver, sessions.pop(session_id, {}))
             session_queues.pop(session_id, None)
         return result
 
     except Exception as e:
         log_func(f"Error in retry_notional_worker: {str(e)}")
-        driver.quit()
+        driver_pool.discard(driver, e)
         sessions.pop(session_id, None)
         session_queues.pop(session_id, None)
         raise
 
+# Run a login job to completion; shared by /login and /jobs/login
+# calculation_data comes from fill_processed_data, which callers run up front
+# so bad inputs are a 400 before anything is queued. on_queued(position, eta)
+# follows the wait for a browser slot; position 0 means the login has been admitted
+async def run_login(request: LoginRequest, calculation_data: Dict, queue: asyncio.Queue, on_queued=None,
+                    priority=PRIORITY_NEW):
+    session_id = request.session_id
+    loop = asyncio.get_running_loop()
+    def log_func(message):
+        log_message(message, queue, loop)
+    def report_queue(position, eta):
+        if position:
+            log_func(f"等候瀏覽器 : 排第 {position} 位, 預計約 {int(eta)} 秒")
+        if on_queued:
+            on_queued(position, eta)
+    result = await admission.run(lambda: run_in_thread(
+        selenium_worker,
+        session_id,
+        request.url,
+        request.username,
+        request.password,
+        calculation_data,
+        request.cashValueInfo.dict(),
+        request.formData.dict(),
+        queue,
+        loop,
+        priority=priority,
+        advisor=request.username,
+    ), report_queue, priority, request.username)
+    if result["status"] == "retry":
+        return {
+            "status": "retry",
+            "system_message": result["system_message"],
+            "session_id": session_id,
+            "pdf_base64": result.get("pdf_base64"),
+            "filename": result.get("filename")
+        }
+    try:
+        return await complete_checkout(result, log_func)
+    finally:
+        await release_if_finished(session_id)
+
+# Run a retry with a new notional amount; shared by /retry-notional and /jobs/retry-notional
+async def run_retry(request: RetryRequest, queue: asyncio.Queue):
+    loop = asyncio.get_running_loop()
+    result = await run_in_thread(
+        retry_notional_worker,
+        request.session_id,
+        request.new_notional_amount,
+        queue,
+        loop,
+        priority=PRIORITY_RETRY,
+        advisor=sessions.get(request.session_id, {}).get("username"),
+    )
+    if result["status"] == "success":
+        try:
+            result = await complete_checkout(result, lambda message: log_message(message, queue, loop))
+        finally:
+            await release_if_finished(request.session_id)
+    return result
+
 # Modified /login endpoint
 @app.post("/login")
-async def initiate_login(request: LoginRequest):
+async def initiate_login(request: LoginRequest, http_request: Request):
     session_id = request.session_id
+    owner = await session_owner(http_request, session_id)
+    if owner:
+        return await worker_router.forward(http_request, session_id, owner)
     queue = session_queues.get(session_id)
     if not queue:
         raise HTTPException(status_code=404, detail="Session not found")
-    loop = asyncio.get_running_loop()
+    calculation_data = fill_processed_data(request.calculation_data.dict())
+    await worker_router.claim(session_id)
     try:
-        def log_func(message):
-            log_message(message, queue, loop)
-        result = await run_in_thread(
-            selenium_worker,
-            session_id,
-            request.url,
-            request.username,
-            request.password,
-            request.calculation_data.dict(),
-            request.cashValueInfo.dict(),
-            request.formData.dict(),
-            queue,
-            loop
-        )
-        if result["status"] == "retry":
-            return {
-                "status": "retry",
-                "system_message": result["system_message"],
-                "session_id": session_id,
-                "pdf_base64": result.get("pdf_base64"),
-                "filename": result.get("filename")
-            }
-        else:
-            return result
+        return await run_login(request, calculation_data, queue)
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(int(e.retry_after))})
+    except HTTPException:
+        raise
     except Exception as e:
         session_queues.pop(session_id, None)
+        await worker_router.release(session_id)
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/retry-notional")
-async def retry_notional(request: RetryRequest):
+async def retry_notional(request: RetryRequest, http_request: Request):
     session_id = request.session_id
+    owner = await session_owner(http_request, session_id)
+    if owner:
+        return await worker_router.forward(http_request, session_id, owner)
     queue = session_queues.get(session_id)
     if not queue:
         raise HTTPException(status_code=404, detail="Session not found")
-    loop = asyncio.get_running_loop()
+    await worker_router.claim(session_id)
     try:
-        result = await run_in_thread(
-            retry_notional_worker,
-            session_id,
-            request.new_notional_amount,
-            queue,
-            loop,
-        )
-        return result
+        return await run_retry(request, queue)
     except Exception as e:
+        await release_if_finished(session_id)
         raise HTTPException(status_code=500, detail=str(e))
 
+# Job API: submit returns 202 with a job id straight away; the result is
+# polled from /jobs/{job_id} and also sent as a final "result" SSE event
+JOB_TTL = float(os.getenv("JOB_TTL", "3600"))
+jobs = JobStore(ttl=JOB_TTL)
+
+# prepare(), if given, validates the request before the 202 and its result is
+# passed on to run(queue, on_queued, prepared)
+async def submit_job(kind: str, session_id: str, http_request: Request, run, prepare=None):
+    owner = await session_owner(http_request, session_id)
+    if owner:
+        return await worker_router.forward(http_request, session_id, owner)
+    queue = session_queues.get(session_id)
+    if not queue:
+        raise HTTPException(status_code=404, detail="Session not found")
+    if jobs.active_for_session(session_id):
+        raise HTTPException(status_code=409, detail="A job is already running for this session")
+    await worker_router.claim(session_id)
+    if kind == "login":
+        try:
+            admission.check()
+        except AdmissionRejected as e:
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(int(e.retry_after))})
+    prepared = (prepare(),) if prepare else ()
+
+    def on_finish(job):
+        # A login turned away by admission never started, so like /login's
+        # 503 it keeps the session for another attempt
+        if job["status"] == "failed" and job["kind"] == "login" and job["retry_after"] is None:
+            session_queues.pop(session_id, None)
+        if session_id not in session_queues:
+            asyncio.create_task(worker_router.release(session_id))
+        queue.put_nowait({"event": "result", "data": JobStore.public(job)})
+
+    def on_queued(job, position, eta):
+        job["status"] = "queued" if position else "running"
+        job["queue_position"] = position or None
+        job["eta_seconds"] = int(eta) if position else None
+
+    job = jobs.submit(kind, session_id, lambda job: run(queue, lambda *args: on_queued(job, *args), *prepared), on_finish)
+    await worker_router.claim(f"job:{job['job_id']}")
+    return JSONResponse(
+        status_code=202,
+        content=JobStore.public(job),
+        headers={"Location": f"/jobs/{job['job_id']}"},
+    )
+
+# priority=batch queues a login behind interactive ones
+@app.post("/jobs/login", status_code=202)
+async def submit_login_job(request: LoginRequest, http_request: Request, priority: str = "new"):
+    if priority not in ("new", "batch"):
+        raise HTTPException(status_code=400, detail="priority must be new or batch")
+    return await submit_job(
+        "login", request.session_id, http_request,
+        lambda queue, on_queued, calculation_data: run_login(
+            request, calculation_data, queue, on_queued, PRIORITY_NAMES[priority]),
+        prepare=lambda: fill_processed_data(request.calculation_data.dict()),
+    )
+
+@app.post("/jobs/retry-notional", status_code=202)
+async def submit_retry_job(request: RetryRequest, http_request: Request):
+    return await submit_job("retry", request.session_id, http_request, lambda queue, on_queued: run_retry(request, queue))
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, http_request: Request):
+    job = jobs.get(job_id)
+    if not job:
+        owner = await worker_router.owner_address(http_request, f"job:{job_id}")
+        if owner:
+            return await worker_router.forward(http_request, f"job:{job_id}", owner)
+        raise HTTPException(status_code=404, detail="Job not found")
+    return JobStore.public(job)
+
+async def expire_jobs():
+    while True:
+        await asyncio.sleep(60)
+        expired = jobs.expire()
+        if expired:
+            logger.info(f"Dropped {expired} finished jobs")
+
+@app.on_event("startup")
+async def start_job_reaper():
+    asyncio.create_task(expire_jobs())
+
 # SSE endpoint for logs
 @app.get("/logs/{session_id}")
-async def stream_logs(session_id: str):
+async def stream_logs(session_id: str, http_request: Request):
+    owner = await session_owner(http_request, session_id)
+    if owner:
+        return await worker_router.forward_stream(http_request, session_id, owner)
     queue = session_queues.get(session_id)
     if not queue:
         raise HTTPException(status_code=404, detail="Session not found")
+    await worker_router.claim(session_id)
 
     async def event_generator():
         while True:
             message = await queue.get()
-            yield f"data: {message}\n\n"
+            if isinstance(message, dict):
+                # Named events (e.g. a job's final result) carry JSON
+                yield f"event: {message['event']}\ndata: {json.dumps(message['data'], ensure_ascii=False)}\n\n"
+            else:
+                yield f"data: {message}\n\n"
 
     return StreamingResponse(event_generator(), media_type="text/event-stream")
 
@@ -773,41 +1337,273 @@ class OutputData(BaseModel):
     age: int
     medicalPremium: float
 
-@app.post("/getData", response_model=List[OutputData])
-async def get_data(request: CalculationRequest):
-    try:
-        json_file = os.path.join(
-            "plans",
-            request.company,
-            f"{request.planFileName}.json"
-        )
-        print("request.planFileName=", request.planFileName)
-        print("request.planOption=", request.planOption)
-        with open(json_file, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-
-        max_age = 100
-        max_years = max(max_age - request.age + 1, 1)
-        result = []
-        for year in range(1, max_years + 1):
-            current_age = request.age + year - 1
-            if str(current_age) not in data[str(request.planOption)]:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Premium data not found for age {current_age}"
-                )
-            result.append({
-                "yearNumber": year,
-                "age": current_age,
-                "medicalPremium": data[str(request.planOption)][str(current_age)]
-            })
-        return result
-    except FileNotFoundError:
-        logger.error(f"JSON file not found: {json_file}")
+class BatchCalculationRequest(BaseModel):
+    # Either an explicit list of requests, or a cartesian spec of
+    # planFileNames x planOptions x ages for one company
+    requests: List[CalculationRequest] = []
+    company: Optional[str] = None
+    planFileNames: List[str] = []
+    planOptions: List[str] = []
+    ages: List[int] = []
+
+class BatchCalculationResult(BaseModel):
+    company: str
+    planFileName: str
+    planOption: str
+    age: int
+    data: Optional[List[OutputData]] = None
+    error: Optional[str] = None
+
+MAX_BATCH_SIZE = 500
+
+def load_premiums(company: str, plan_file_name: str, plan_option: str, age: int):
+    if not plan_store.has_plan(company, plan_file_name):
+        logger.error(f"Plan not found: {company}/{plan_file_name}")
         raise HTTPException(status_code=404, detail="Plan data not found")
+    try:
+        table = plan_store.get(company, plan_file_name, plan_option)
     except KeyError as e:
         logger.error(f"Invalid key: {str(e)}")
         raise HTTPException(status_code=400, detail=f"Invalid parameters: {str(e)}")
-    except json.JSONDecodeError:
-        logger.error("JSON decode error")
-        raise HTTPException(status_code=500, detail="Invalid JSON data")
\ No newline at end of file
+
+    max_age = 100
+    end_age = max(max_age, age)
+    missing_age = table.first_missing_age(age, end_age)
+    if missing_age is not None:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Premium data not found for age {missing_age}"
+        )
+    return table.project(age, end_age)
+
+def project_premiums(company: str, plan_file_name: str, plan_option: str, age: int):
+    premiums = load_premiums(company, plan_file_name, plan_option, age)
+    return [
+        {"yearNumber": year, "age": age + year - 1, "medicalPremium": premium}
+        for year, premium in enumerate(premiums, start=1)
+    ]
+
+# Plan-table responses are pure functions of the plan file and the request,
+# so their GET forms carry an ETag built from the plan content digest and the
+# query parameters and answer If-None-Match with 304. The POST forms are not
+# conditional, as a matching If-None-Match on a POST calls for 412, not 304
+PLAN_CACHE_MAX_AGE = int(os.getenv("PLAN_CACHE_MAX_AGE", "60"))
+ETAG_SCHEMA = "1"  # bump when a response shape changes
+
+def plan_version(company: str, plan_file_name: str):
+    try:
+        return plan_store.version(company, plan_file_name)
+    except KeyError:
+        return None
+
+def compute_etag(*parts):
+    payload = json.dumps([ETAG_SCHEMA, *parts], ensure_ascii=False, sort_keys=True, default=str)
+    return '"' + hashlib.sha1(payload.encode('utf-8')).hexdigest() + '"'
+
+def etag_matches(http_request: Request, etag: str):
+    header = http_request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = [tag.strip() for tag in header.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+def cache_headers(etag: str):
+    return {
+        "ETag": etag,
+        "Cache-Control": f"private, max-age={PLAN_CACHE_MAX_AGE}, must-revalidate",
+    }
+
+@app.post("/getData", response_model=List[OutputData])
+async def get_data(request: CalculationRequest):
+    print("request.planFileName=", request.planFileName)
+    print("request.planOption=", request.planOption)
+    return project_premiums(request.company, request.planFileName, request.planOption, request.age)
+
+@app.get("/getData", response_model=List[OutputData])
+async def get_data_cached(
+    http_request: Request,
+    response: Response,
+    company: str,
+    planFileName: str,
+    planOption: str,
+    age: int,
+):
+    version = plan_version(company, planFileName)
+    etag = None
+    if version:
+        etag = compute_etag("getData", version, company, planFileName, planOption, age)
+        if etag_matches(http_request, etag):
+            return Response(status_code=304, headers=cache_headers(etag))
+    result = project_premiums(company, planFileName, planOption, age)
+    if etag:
+        response.headers.update(cache_headers(etag))
+    return result
+
+@app.post("/getData/batch", response_model=List[BatchCalculationResult])
+async def get_data_batch(request: BatchCalculationRequest):
+    items = [(r.company, r.planFileName, r.planOption, r.age) for r in request.requests]
+    if request.planFileNames or request.planOptions or request.ages:
+        if not (request.company and request.planFileNames and request.planOptions and request.ages):
+            raise HTTPException(
+                status_code=400,
+                detail="company, planFileNames, planOptions and ages are all required for a cartesian batch"
+            )
+        items.extend(
+            (request.company, plan_file_name, plan_option, age)
+            for plan_file_name in request.planFileNames
+            for plan_option in request.planOptions
+            for age in request.ages
+        )
+    if len(items) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"Batch too large (max {MAX_BATCH_SIZE})")
+
+    # Identical combinations are projected once and shared across the batch
+    projections = {}
+    results = []
+    for item in items:
+        if item not in projections:
+            try:
+                projections[item] = {"data": project_premiums(*item)}
+            except HTTPException as e:
+                projections[item] = {"error": e.detail}
+        company, plan_file_name, plan_option, age = item
+        results.append({
+            "company": company,
+            "planFileName": plan_file_name,
+            "planOption": plan_option,
+            "age": age,
+            **projections[item]
+        })
+    return results
+
+class PlanCatalogEntry(BaseModel):
+    company: str
+    planFileName: str
+    plan: Optional[str] = None
+    variant: Optional[str] = None
+    effectiveDate: Optional[str] = None
+    currency: Optional[str] = None
+    gender: Optional[str] = None
+    ward: Optional[str] = None
+    options: List[str]
+
+@app.get("/plans/catalog", response_model=List[PlanCatalogEntry])
+async def get_plan_catalog(
+    http_request: Request,
+    response: Response,
+    company: Optional[str] = None,
+    plan: Optional[str] = None,
+    variant: Optional[str] = None,
+    currency: Optional[str] = None,
+    gender: Optional[str] = None,
+    ward: Optional[str] = None,
+    effectiveFrom: Optional[str] = None,
+    effectiveTo: Optional[str] = None,
+):
+    etag = compute_etag(
+        "plans/catalog", plan_catalog.version,
+        company, plan, variant, currency, gender, ward, effectiveFrom, effectiveTo
+    )
+    if etag_matches(http_request, etag):
+        return Response(status_code=304, headers=cache_headers(etag))
+    response.headers.update(cache_headers(etag))
+    return plan_catalog.query(
+        effective_from=effectiveFrom,
+        effective_to=effectiveTo,
+        company=company,
+        plan=plan,
+        variant=variant,
+        currency=currency,
+        gender=gender,
+        ward=ward,
+    )
+
+# Server-side processedData projection
+class ProjectionRequest(BaseModel):
+    company: str
+    planFileName: str
+    planOption: str
+    age: int
+    inflationRate: float = 0
+    currencyRate: Optional[float] = None
+
+class ProjectionRow(BaseModel):
+    yearNumber: int
+    age: int
+    basePremium: float
+    medicalPremium: float
+    accumulatedMP: float
+    medicalPremiumUSD: Optional[float] = None
+    accumulatedMPUSD: Optional[float] = None
+
+class ProjectionResponse(BaseModel):
+    processedData: List[ProjectionRow]
+    totalAccumulatedMP: float
+
+def build_projection(company: str, plan_file_name: str, plan_option: str, age: int, inflation_rate=0, currency_rate=None):
+    premiums = load_premiums(company, plan_file_name, plan_option, age)
+    processed_data, total = project_premium_schedule(premiums, age, inflation_rate, currency_rate)
+    return {"processedData": processed_data, "totalAccumulatedMP": total}
+
+def fill_processed_data(calculation_data: Dict):
+    """Build processedData from the plan named in inputs when the client sent none."""
+    if calculation_data['processedData']:
+        return calculation_data
+    inputs = calculation_data['inputs']
+    missing = [key for key in ('company', 'planFileName', 'planOption', 'age') if not inputs.get(key)]
+    if missing:
+        raise HTTPException(
+            status_code=400,
+            detail=f"processedData is empty and inputs lack {', '.join(missing)}"
+        )
+    currency_rate = inputs.get('currencyRate')
+    calculation_data.update(build_projection(
+        inputs['company'],
+        inputs['planFileName'],
+        str(inputs['planOption']),
+        int(inputs['age']),
+        float(inputs.get('inflationRate') or 0),
+        float(currency_rate) if currency_rate else None,
+    ))
+    return calculation_data
+
+@app.post("/projection", response_model=ProjectionResponse, response_model_exclude_none=True)
+async def get_projection(request: ProjectionRequest):
+    return build_projection(
+        request.company,
+        request.planFileName,
+        request.planOption,
+        request.age,
+        request.inflationRate,
+        request.currencyRate,
+    )
+
+@app.get("/projection", response_model=ProjectionResponse, response_model_exclude_none=True)
+async def get_projection_cached(
+    http_request: Request,
+    response: Response,
+    company: str,
+    planFileName: str,
+    planOption: str,
+    age: int,
+    inflationRate: float = 0,
+    currencyRate: Optional[float] = None,
+):
+    request = ProjectionRequest(
+        company=company,
+        planFileName=planFileName,
+        planOption=planOption,
+        age=age,
+        inflationRate=inflationRate,
+        currencyRate=currencyRate,
+    )
+    version = plan_version(company, planFileName)
+    etag = None
+    if version:
+        etag = compute_etag("projection", version, request.dict())
+        if etag_matches(http_request, etag):
+            return Response(status_code=304, headers=cache_headers(etag))
+    result = build_projection(company, planFileName, planOption, age, inflationRate, currencyRate)
+    if etag:
+        response.headers.update(cache_headers(etag))
+    return result
@@ -0,0 +1,160 @@
+import io
+import re
+import pdfplumber
+import pypdfium2 as pdfium
+from surrender_values import FULL_WIDTH
+
+# Headings of the surrender-value table, most specific first; the first one
+# found on any page wins. Manulife proposals carry no summary table, so their
+# current-assumption (not pessimistic) withdrawal illustration is used; the
+# bracket after its heading keeps out the notes page that quotes the heading
+SURRENDER_SUMMARY_TITLES = (
+    "退保價值之說明摘要",
+    "在現時假設情景下款項提取說明-退保價值(",
+)
+# Locates the table by its total column when no heading matches
+TABLE_HEADER = "(A)+(B)+(C)"
+# Trailing pages parsed, besides page 1, when the table cannot be located at
+# all, so an unknown layout costs a bounded parse rather than a full one
+FALLBACK_PAGES = 8
+ROW_PATTERN = re.compile(r"^\s*(\d{1,3})\s")
+MAX_CONTEXT_CHARS = 12000
+# A basic-plan row of the page-1 summary: the annual premium is the amount
+# just before the guaranteed-premium column (是/否)
+BASIC_PREMIUM_PATTERN = re.compile(r"([\d,]+\.\d{2})\s+[是否]\s")
+TERMINATION_PATTERN = re.compile(r"由[於于]所有保單值已被提取，本保單將[於于]第(\d+)保單年度終結時終止")
+
+
+def _normalize(text):
+    # pdfium breaks lines with \r\n and wraps sentences mid-word; 說 comes in
+    # either form and headings use assorted dashes and full-width brackets
+    text = re.sub(r"\s+", "", text).replace("説", "說")
+    return re.sub(r"[–—－]", "-", text).translate(FULL_WIDTH)
+
+
+def page_texts(pdf_bytes):
+    """Plain text of every page via pdfium; cheap enough to scan a whole proposal."""
+    pdf = pdfium.PdfDocument(pdf_bytes)
+    try:
+        texts = []
+        for index in range(len(pdf)):
+            page = pdf[index]
+            textpage = page.get_textpage()
+            texts.append(textpage.get_text_bounded())
+            textpage.close()
+            page.close()
+        return texts
+    finally:
+        pdf.close()
+
+
+def find_termination_year(texts):
+    """Policy year of the 'all values withdrawn' termination sentence, or None."""
+    for text in texts:
+        match = TERMINATION_PATTERN.search(_normalize(text))
+        if match:
+            return int(match.group(1))
+    return None
+
+
+def find_basic_premium(text):
+    """Annual premium of the first basic plan on page 1, in the policy currency, or None."""
+    lines = text.splitlines()
+    for i, line in enumerate(lines):
+        if line.strip() != "基本計劃":
+            continue
+        for row in lines[i + 1:i + 4]:
+            match = BASIC_PREMIUM_PATTERN.search(row)
+            if match:
+                return float(match.group(1).replace(",", ""))
+        return None
+    return None
+
+
+def locate_pages(texts):
+    """Indexes (0-based) of page 1, the surrender-value summary and the termination sentence."""
+    normalized = [_normalize(text) for text in texts]
+    summary_pages = []
+    for title in SURRENDER_SUMMARY_TITLES:
+        summary_pages = [i for i, text in enumerate(normalized) if title in text]
+        if summary_pages:
+            break
+    else:
+        summary_pages = [i for i, text in enumerate(normalized) if TABLE_HEADER in text]
+    termination_pages = [i for i, text in enumerate(normalized) if TERMINATION_PATTERN.search(text)]
+    return {
+        "first_page": 0 if texts else None,
+        "summary_pages": summary_pages,
+        "termination_pages": termination_pages,
+    }
+
+
+def extract_pages(pdf_bytes, indexes):
+    """Layout-aware text of the given pages only, via pdfplumber."""
+    if not indexes:
+        return {}
+    with pdfplumber.open(io.BytesIO(pdf_bytes), pages=[i + 1 for i in indexes]) as pdf:
+        return {page.page_number - 1: page.extract_text() or "" for page in pdf.pages}
+
+
+def extract_proposal(pdf_bytes):
+    """Locate the pages of a proposal PDF that matter and fully parse only those.
+
+    Returns {"page_count", "pages": {index: text}, "summary_pages"}. If the
+    surrender-value table cannot be located, page 1 and the last
+    FALLBACK_PAGES pages are parsed instead.
+    """
+    texts = page_texts(pdf_bytes)
+    located = locate_pages(texts)
+    if located["summary_pages"]:
+        indexes = {located["first_page"], *located["summary_pages"], *located["termination_pages"]}
+    else:
+        indexes = {located["first_page"], *range(max(0, len(texts) - FALLBACK_PAGES), len(texts))}
+        indexes.update(located["termination_pages"])
+    indexes = sorted(i for i in indexes if i is not None)
+    return {
+        "page_count": len(texts),
+        "pages": extract_pages(pdf_bytes, indexes),
+        "summary_pages": located["summary_pages"],
+    }
+
+
+def proposal_text(extraction):
+    """The parsed pages joined in page order, each tagged with its page number."""
+    return "\n".join(
+        f"[第{index + 1}頁]\n{text}" for index, text in sorted(extraction["pages"].items())
+    )
+
+
+def _plan_summary(text):
+    # Page 1 up to its numbered footnotes
+    lines = []
+    for line in text.splitlines():
+        if re.match(r"^\s*1\.\s", line):
+            break
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def build_ai_context(extraction, years, window=2):
+    """A small prompt: the page-1 plan summary plus table rows around the target years.
+
+    The surrender-value table keeps its header lines and only the rows within
+    window years of each target. Without a located table the parsed text is
+    used, capped at MAX_CONTEXT_CHARS either way.
+    """
+    pages = extraction["pages"]
+    parts = []
+    if 0 in pages:
+        parts.append(f"[第1頁]\n{_plan_summary(pages[0])}")
+    wanted = {year + offset for year in years for offset in range(-window, window + 1)}
+    for index in extraction["summary_pages"]:
+        lines = pages.get(index, "").splitlines()
+        first_row = next((i for i, line in enumerate(lines) if ROW_PATTERN.match(line)), len(lines))
+        matches = ((line, ROW_PATTERN.match(line)) for line in lines[first_row:])
+        rows = [line for line, match in matches if match and int(match.group(1)) in wanted]
+        if rows:
+            parts.append(f"[第{index + 1}頁]\n" + "\n".join(lines[:first_row] + rows))
+    if len(parts) < 2:
+        return proposal_text(extraction)[:MAX_CONTEXT_CHARS]
+    return "\n".join(parts)[:MAX_CONTEXT_CHARS]
@@ -0,0 +1,83 @@
+import json
+import os
+import sys
+
+from plan_store import (
+    BUNDLE_ALIGN,
+    BUNDLE_FILE_NAME,
+    BUNDLE_MAGIC,
+    BUNDLE_PREAMBLE,
+    BUNDLE_VERSION,
+    PlanStore,
+    parse_plan_file_name,
+)
+
+
+def _pad(length):
+    return -length % BUNDLE_ALIGN
+
+
+def build_bundle(root="plans", out_path=None):
+    """Compile every plans/<company>/*.json into one binary bundle.
+
+    The header is a JSON index with one entry per (company, plan, option)
+    carrying the fields parsed from the file name, the source mtime and the
+    location of its premium array in the data section.
+    """
+    out_path = out_path or os.path.join(root, BUNDLE_FILE_NAME)
+    # Read straight from the JSON sources, never from a previous bundle
+    store = PlanStore(root, use_bundle=False)
+    store.load_all()
+
+    entries = []
+    chunks = []
+    offset = 0
+    for path, record, tables in sorted(store.files()):
+        fields = parse_plan_file_name(record["planFileName"])
+        for (company, plan_file_name, option), table in tables.items():
+            raw = table.values.tobytes()
+            entries.append({
+                "path": [company, os.path.basename(path)],
+                "mtime": record["mtime"],
+                "digest": record["digest"],
+                "company": company,
+                "planFileName": plan_file_name,
+                **fields,
+                "option": option,
+                "typecode": table.values.typecode,
+                "firstAge": table.first_age,
+                "missing": table.missing,
+                "offset": offset,
+                "count": len(table.values),
+            })
+            chunks.append(raw + b"\0" * _pad(len(raw)))
+            offset += len(raw) + _pad(len(raw))
+
+    header = {"byteorder": sys.byteorder, "dataOffset": 0, "tables": entries}
+    # dataOffset depends on the header length, so settle it before writing
+    header_bytes = b""
+    while True:
+        encoded = json.dumps(header, ensure_ascii=False).encode('utf-8')
+        if len(encoded) == len(header_bytes):
+            break
+        header_bytes = encoded
+        data_offset = BUNDLE_PREAMBLE.size + len(header_bytes)
+        header["dataOffset"] = data_offset + _pad(data_offset)
+    header_bytes = encoded
+
+    tmp_path = out_path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(BUNDLE_PREAMBLE.pack(BUNDLE_MAGIC, BUNDLE_VERSION, len(header_bytes)))
+        f.write(header_bytes)
+        f.write(b"\0" * (header["dataOffset"] - f.tell()))
+        for chunk in chunks:
+            f.write(chunk)
+    # Atomic swap so running workers never map a half-written bundle
+    os.replace(tmp_path, out_path)
+    return out_path, len(entries)
+
+
+if __name__ == "__main__":
+    root = sys.argv[1] if len(sys.argv) > 1 else "plans"
+    out_path, count = build_bundle(root)
+    print(f"Plan bundle saved to {out_path} ({count} tables)")
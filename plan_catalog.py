@@ -0,0 +1,77 @@
+import hashlib
+from bisect import bisect_left, bisect_right
+
+from plan_store import parse_plan_file_name
+
+CATALOG_FIELDS = ("company", "plan", "variant", "currency", "gender", "ward")
+
+
+class PlanCatalog:
+    """Searchable index over the metadata encoded in plan file names.
+
+    Equality filters are answered from per-field hash indexes and the
+    effective date range from a sorted list, so a query costs a few set
+    intersections and two bisects instead of a scan over every plan.
+    """
+
+    def __init__(self):
+        self._entries = []
+        self._index = {field: {} for field in CATALOG_FIELDS}
+        self._dates = []  # sorted (effectiveDate, entry id)
+        self.version = None  # digest over every indexed file, for ETags
+
+    def rebuild(self, plan_store):
+        entries = []
+        digest = hashlib.sha1()
+        for _, record, tables in sorted(plan_store.files()):
+            digest.update(f"{record['company']}/{record['planFileName']}:{record['digest']}\n".encode('utf-8'))
+            entries.append({
+                "company": record["company"],
+                "planFileName": record["planFileName"],
+                **parse_plan_file_name(record["planFileName"]),
+                "options": [option for _, _, option in tables],
+            })
+        entries.sort(key=lambda e: (e["company"], e["planFileName"]))
+
+        index = {field: {} for field in CATALOG_FIELDS}
+        dates = []
+        for entry_id, entry in enumerate(entries):
+            for field in CATALOG_FIELDS:
+                index[field].setdefault(entry[field], set()).add(entry_id)
+            if entry["effectiveDate"]:
+                dates.append((entry["effectiveDate"], entry_id))
+        dates.sort()
+
+        # Swap in one go so concurrent queries see either the old or new index
+        self._entries, self._index, self._dates = entries, index, dates
+        self.version = digest.hexdigest()
+        return len(entries)
+
+    def query(self, effective_from=None, effective_to=None, **filters):
+        """Return entries matching every given field and the date range.
+
+        Dates compare as ISO strings, so "2024-06" matches from the start of
+        that month for effective_from and to its end for effective_to.
+        """
+        entries, index, dates = self._entries, self._index, self._dates
+        candidates = []
+        for field, value in filters.items():
+            if value is None:
+                continue
+            if field not in index:
+                raise ValueError(f"Unknown catalog field: {field}")
+            candidates.append(index[field].get(value, set()))
+
+        if effective_from is not None or effective_to is not None:
+            lo = 0 if effective_from is None else bisect_left(dates, (effective_from,))
+            hi = len(dates) if effective_to is None else bisect_right(dates, (effective_to + "\uffff",))
+            candidates.append({entry_id for _, entry_id in dates[lo:hi]})
+
+        if not candidates:
+            return list(entries)
+        candidates.sort(key=len)
+        matched = set(candidates[0]).intersection(*candidates[1:])
+        return [entries[entry_id] for entry_id in sorted(matched)]
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,292 @@
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+import threading
+from array import array
+from bisect import bisect_left
+
+logger = logging.getLogger(__name__)
+
+INT32_MIN, INT32_MAX = -2**31, 2**31 - 1
+
+# Binary bundle written by plan_bundle.py: a fixed preamble, a JSON header
+# index, then every premium array back to back (8-byte aligned, native order)
+BUNDLE_FILE_NAME = "plans.bin"
+BUNDLE_MAGIC = b"PLANBNDL"
+BUNDLE_VERSION = 2
+BUNDLE_PREAMBLE = struct.Struct("<8sII")  # magic, version, header length
+BUNDLE_ALIGN = 8
+
+
+def parse_plan_file_name(plan_file_name):
+    """Split a plan file name into its metadata fields.
+
+    Names look like {plan}_{variant}_{effectiveDate}_{currency}_{gender}_{ward},
+    where the variant may itself contain underscores and "na" means unset.
+    """
+    parts = plan_file_name.split("_")
+    fields = dict.fromkeys(("plan", "variant", "effectiveDate", "currency", "gender", "ward"))
+    if len(parts) < 5:
+        fields["plan"] = plan_file_name
+        return fields
+    *name_parts, effective_date, currency, gender, ward = parts
+    values = {
+        "plan": name_parts[0],
+        "variant": "_".join(name_parts[1:]),
+        "effectiveDate": effective_date,
+        "currency": currency,
+        "gender": gender,
+        "ward": ward,
+    }
+    for field, value in values.items():
+        fields[field] = None if value in ("", "na") else value
+    return fields
+
+
+class PremiumTable:
+    """Premiums of one plan option stored as a compact array indexed by age.
+
+    Integer tables use an int32 array, anything else a float64 array. Ages
+    missing inside the covered range are kept in a sorted list so range
+    validation is a bisect instead of a per-age lookup.
+    """
+
+    __slots__ = ("first_age", "values", "missing")
+
+    def __init__(self, first_age, values, missing):
+        self.first_age = first_age
+        self.values = values
+        self.missing = missing
+
+    @classmethod
+    def from_dict(cls, table):
+        """Build a table from {age: premium}; raises ValueError on a non-numeric premium."""
+        premiums = {int(age): value for age, value in table.items()}
+        for age, value in premiums.items():
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                raise ValueError(f"premium for age {age} is not a number: {value!r}")
+        if not premiums:
+            return cls(0, array('i'), [])
+        first_age, last_age = min(premiums), max(premiums)
+        is_int32 = all(
+            isinstance(v, int) and INT32_MIN <= v <= INT32_MAX
+            for v in premiums.values()
+        )
+        values = array('i' if is_int32 else 'd', [0]) * (last_age - first_age + 1)
+        for age, value in premiums.items():
+            values[age - first_age] = value
+        missing = [
+            age for age in range(first_age, last_age + 1) if age not in premiums
+        ]
+        return cls(first_age, values, missing)
+
+    @property
+    def last_age(self):
+        return self.first_age + len(self.values) - 1
+
+    def first_missing_age(self, start_age, end_age):
+        """Return the first age in [start_age, end_age] without a premium, or None."""
+        if start_age < self.first_age:
+            return start_age
+        if end_age > self.last_age:
+            return max(start_age, self.last_age + 1)
+        i = bisect_left(self.missing, start_age)
+        if i < len(self.missing) and self.missing[i] <= end_age:
+            return self.missing[i]
+        return None
+
+    def project(self, start_age, end_age):
+        """Return the premiums for ages start_age..end_age as one array slice."""
+        return self.values[start_age - self.first_age:end_age - self.first_age + 1]
+
+    def __contains__(self, age):
+        return self.first_missing_age(age, age) is None
+
+    def __getitem__(self, age):
+        if age not in self:
+            raise KeyError(str(age))
+        return self.values[age - self.first_age]
+
+    def __len__(self):
+        return len(self.values) - len(self.missing)
+
+
+class PlanStore:
+    """Keeps every premium table under plans/ in memory.
+
+    Tables are keyed by (company, planFileName, planOption). Files are read
+    once by load_all() and afterwards only re-read by refresh() when their
+    mtime changes, so plan updates go live without a restart.
+    """
+
+    def __init__(self, root="plans", bundle_path=None, use_bundle=True):
+        self.root = root
+        self.bundle_path = bundle_path or os.path.join(root, BUNDLE_FILE_NAME)
+        self.use_bundle = use_bundle
+        self._tables = {}  # (company, planFileName, planOption) -> PremiumTable
+        self._files = {}   # path -> {"mtime", "digest", "company", "planFileName", "keys"}
+        self._bundle_mtime = None
+        self._bundle = None  # mmap backing the bundled tables
+        self._lock = threading.Lock()
+
+    def _scan(self):
+        found = {}
+        if not os.path.isdir(self.root):
+            return found
+        for company in os.listdir(self.root):
+            company_dir = os.path.join(self.root, company)
+            if not os.path.isdir(company_dir):
+                continue
+            for filename in os.listdir(company_dir):
+                if not filename.endswith(".json"):
+                    continue
+                path = os.path.join(company_dir, filename)
+                try:
+                    mtime = os.stat(path).st_mtime_ns
+                except FileNotFoundError:
+                    continue
+                found[path] = (company, filename[:-len(".json")], mtime)
+        return found
+
+    def _load_file(self, company, plan_file_name, path):
+        with open(path, 'rb') as f:
+            raw = f.read()
+        data = json.loads(raw.decode('utf-8'))
+        tables = {
+            (company, plan_file_name, str(option)): PremiumTable.from_dict(table)
+            for option, table in data.items()
+        }
+        return hashlib.sha1(raw).hexdigest(), tables
+
+    def _load_bundle(self):
+        """Map the compiled bundle and return its tables grouped by source file.
+
+        Arrays are memoryviews straight into the shared mapping, so nothing
+        is copied and every worker process reads the same pages.
+        """
+        with open(self.bundle_path, 'rb') as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, header_len = BUNDLE_PREAMBLE.unpack_from(mm, 0)
+        if magic != BUNDLE_MAGIC or version != BUNDLE_VERSION:
+            raise ValueError(f"Unsupported plan bundle {self.bundle_path}")
+        header_start = BUNDLE_PREAMBLE.size
+        header = json.loads(bytes(mm[header_start:header_start + header_len]).decode('utf-8'))
+        if header["byteorder"] != sys.byteorder:
+            raise ValueError(f"Plan bundle built for {header['byteorder']}-endian machines")
+
+        data = memoryview(mm)[header["dataOffset"]:]
+        files = {}
+        for entry in header["tables"]:
+            itemsize = struct.calcsize(entry["typecode"])
+            start = entry["offset"]
+            values = data[start:start + entry["count"] * itemsize].cast(entry["typecode"])
+            source = files.setdefault(os.path.join(self.root, *entry["path"]), {
+                "mtime": entry["mtime"],
+                "digest": entry["digest"],
+                "company": entry["company"],
+                "planFileName": entry["planFileName"],
+                "tables": {},
+            })
+            key = (entry["company"], entry["planFileName"], entry["option"])
+            source["tables"][key] = PremiumTable(entry["firstAge"], values, entry["missing"])
+        return mm, files
+
+    def _refresh_bundle(self):
+        if not self.use_bundle:
+            return 0
+        try:
+            mtime = os.stat(self.bundle_path).st_mtime_ns
+        except FileNotFoundError:
+            return 0
+        if mtime == self._bundle_mtime:
+            return 0
+        try:
+            mm, files = self._load_bundle()
+        except (OSError, ValueError, KeyError, struct.error) as e:
+            logger.error(f"Failed to load plan bundle {self.bundle_path}: {e}")
+            return 0
+        self._bundle, self._bundle_mtime = mm, mtime
+        for path, source in files.items():
+            self._replace_file(path, source["mtime"], source["digest"], source["company"], source["planFileName"], source["tables"])
+        logger.info(f"Loaded plan bundle {self.bundle_path} ({len(files)} files)")
+        return len(files)
+
+    def _replace_file(self, path, mtime, digest, company, plan_file_name, tables):
+        known = self._files.get(path)
+        if known:
+            for key in known["keys"]:
+                if key not in tables:
+                    self._tables.pop(key, None)
+        self._tables.update(tables)
+        self._files[path] = {
+            "mtime": mtime,
+            "digest": digest,
+            "company": company,
+            "planFileName": plan_file_name,
+            "keys": list(tables),
+        }
+
+    def load_all(self):
+        return self.refresh()
+
+    def refresh(self):
+        """Reload changed files, pick up new ones and drop deleted ones.
+
+        Tables from a compiled bundle are used for every file whose mtime
+        still matches the one recorded at build time; anything edited since
+        is read from its JSON source. Returns the number of files that were
+        (re)loaded or removed.
+        """
+        with self._lock:
+            reloaded = self._refresh_bundle()
+            found = self._scan()
+
+            for path in list(self._files):
+                if path not in found:
+                    for key in self._files.pop(path)["keys"]:
+                        self._tables.pop(key, None)
+                    logger.info(f"Plan file removed: {path}")
+                    reloaded += 1
+
+            for path, (company, plan_file_name, mtime) in found.items():
+                known = self._files.get(path)
+                if known and known["mtime"] == mtime:
+                    continue
+                try:
+                    digest, tables = self._load_file(company, plan_file_name, path)
+                except (OSError, ValueError, TypeError, AttributeError) as e:
+                    # Keep serving the previous version until the file is fixed
+                    logger.error(f"Failed to load plan file {path}: {e}")
+                    continue
+                self._replace_file(path, mtime, digest, company, plan_file_name, tables)
+                reloaded += 1
+
+            return reloaded
+
+    def files(self):
+        """Yield (path, file record, {table key: PremiumTable}) for every loaded file."""
+        for path, record in list(self._files.items()):
+            yield path, record, {key: self._tables[key] for key in record["keys"]}
+
+    def has_plan(self, company, plan_file_name):
+        path = os.path.join(self.root, company, f"{plan_file_name}.json")
+        return path in self._files
+
+    def version(self, company, plan_file_name):
+        """Content digest of a plan file, stable across restarts and replicas."""
+        path = os.path.join(self.root, company, f"{plan_file_name}.json")
+        return self._files[path]["digest"]
+
+    def get(self, company, plan_file_name, plan_option):
+        """Return the PremiumTable, raising KeyError if unknown."""
+        try:
+            return self._tables[(company, plan_file_name, str(plan_option))]
+        except KeyError:
+            raise KeyError(str(plan_option)) from None
+
+    def __len__(self):
+        return len(self._tables)
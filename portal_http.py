@@ -0,0 +1,47 @@
+import hashlib
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+class PortalHttpClient:
+    """Keep-alive HTTP session that shares one browser's portal login.
+
+    Before each request the jar is emptied and refilled with the driver's
+    current cookies, so nothing the portal set on an earlier download, and
+    nothing from an earlier advisor on a recycled driver, is sent along.
+    Downloads stream into a sha256 hasher as they arrive, so the content
+    digest is ready as soon as the body is.
+    """
+
+    def __init__(self, timeout=60, connect_timeout=10, chunk_size=64 * 1024):
+        self.timeout = (connect_timeout, timeout)
+        self.chunk_size = chunk_size
+        self.session = requests.Session()
+        retry = Retry(total=2, backoff_factor=0.5, status_forcelist=(502, 503, 504), allowed_methods=("GET",))
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=4, max_retries=retry)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def sync_cookies(self, driver):
+        # Cookies are keyed by name alone, as the portal's PDF links always
+        # live on the host the browser is on
+        self.session.cookies.clear()
+        for cookie in driver.get_cookies():
+            self.session.cookies.set(cookie['name'], cookie['value'])
+
+    def download(self, driver, url, referer=None):
+        """GET url with the browser's cookies; returns (body bytes, sha256 hex digest)."""
+        self.sync_cookies(driver)
+        headers = {"Referer": referer} if referer else {}
+        hasher = hashlib.sha256()
+        body = bytearray()
+        with self.session.get(url, headers=headers, stream=True, timeout=self.timeout) as response:
+            response.raise_for_status()
+            for chunk in response.iter_content(self.chunk_size):
+                hasher.update(chunk)
+                body.extend(chunk)
+        return bytes(body), hasher.hexdigest()
+
+    def close(self):
+        self.session.close()
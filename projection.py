@@ -0,0 +1,32 @@
+from itertools import accumulate, repeat
+from operator import mul
+
+
+def project_premium_schedule(premiums, start_age, inflation_rate=0, currency_rate=None):
+    """Build the per-year processedData rows from a slice of plan premiums.
+
+    medicalPremium is the table premium grown by inflation_rate (a percentage)
+    each year after the first, accumulatedMP its running total. When
+    currency_rate is given the rows also carry the USD equivalents.
+    """
+    growth = 1 + float(inflation_rate or 0) / 100
+    factors = accumulate(repeat(growth, len(premiums) - 1), mul, initial=1.0)
+    inflated = [round(premium * factor, 2) for premium, factor in zip(premiums, factors)]
+    accumulated = list(accumulate(inflated))
+
+    rows = []
+    for idx, (premium, medical_premium, accumulated_mp) in enumerate(zip(premiums, inflated, accumulated)):
+        row = {
+            "yearNumber": idx + 1,
+            "age": start_age + idx,
+            "basePremium": premium,
+            "medicalPremium": medical_premium,
+            "accumulatedMP": round(accumulated_mp, 2),
+        }
+        if currency_rate:
+            row["medicalPremiumUSD"] = round(medical_premium / currency_rate, 2)
+            row["accumulatedMPUSD"] = round(accumulated_mp / currency_rate, 2)
+        rows.append(row)
+
+    total = round(accumulated[-1], 2) if accumulated else 0
+    return rows, total
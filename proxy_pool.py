@@ -0,0 +1,195 @@
+import logging
+import socket
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from selenium.common.exceptions import WebDriverException
+
+logger = logging.getLogger(__name__)
+
+
+# Chrome net errors and renderer timeouts that point at the proxy rather
+# than at the portal or the form being filled
+PROXY_ERROR_MARKERS = (
+    "ERR_PROXY",
+    "ERR_TUNNEL",
+    "ERR_SOCKS",
+    "ERR_CONNECTION",
+    "ERR_TIMED_OUT",
+    "ERR_NAME_NOT_RESOLVED",
+    "ERR_INTERNET_DISCONNECTED",
+    "Timed out receiving message from renderer",
+)
+
+
+class ProxyPoolExhausted(TimeoutError):
+    pass
+
+
+def is_proxy_error(error):
+    """True when error is a network or page-load failure worth blaming the proxy for."""
+    return isinstance(error, WebDriverException) and any(marker in str(error) for marker in PROXY_ERROR_MARKERS)
+
+
+class ProxyPool:
+    """Lease/release pool of "ip:port" proxies picked by health score.
+
+    Each proxy tracks an EWMA of observed latency and its recent failures;
+    the free proxy with the lowest score is leased first. A proxy failing
+    quarantine_after times in a row is quarantined, and a background thread
+    re-probes quarantined proxies with a TCP connect until they answer.
+    Callers waiting for a proxy in lease() are served in order, with a
+    timeout.
+    """
+
+    def __init__(self, proxies, quarantine_after=3, quarantine_seconds=300,
+                 probe_interval=60, probe_timeout=5, latency_weight=0.3):
+        self.quarantine_after = quarantine_after
+        self.quarantine_seconds = quarantine_seconds
+        self.probe_interval = probe_interval
+        self.probe_timeout = probe_timeout
+        self.latency_weight = latency_weight
+        self._stats = {
+            proxy: {"latency": None, "failures": 0, "successes": 0, "quarantined_until": 0}
+            for proxy in proxies
+        }
+        self._free = set(self._stats)
+        self._waiters = []  # Futures of callers waiting for a proxy, oldest first
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._prober = None
+
+    def start(self):
+        if self._prober is None:
+            self._stopped.clear()
+            self._prober = threading.Thread(target=self._probe_loop, name="proxy-prober", daemon=True)
+            self._prober.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def score(self, proxy):
+        stats = self._stats[proxy]
+        latency = stats["latency"] if stats["latency"] is not None else 1.0
+        return latency * (1 + stats["failures"])
+
+    def _available(self, now):
+        return [p for p in self._free if self._stats[p]["quarantined_until"] <= now]
+
+    def _take_best(self):
+        candidates = self._available(time.time())
+        if not candidates:
+            return None
+        proxy = min(candidates, key=self.score)
+        self._free.discard(proxy)
+        return proxy
+
+    def _request(self):
+        future = Future()
+        with self._lock:
+            proxy = self._take_best()
+            if proxy is not None:
+                future.set_result(proxy)
+            else:
+                self._waiters.append(future)
+        return future
+
+    def _abandon(self, future):
+        with self._lock:
+            if future in self._waiters:
+                self._waiters.remove(future)
+                return
+        # The proxy was handed over just as the caller gave up
+        if future.done() and not future.cancelled():
+            self.release(future.result())
+
+    def lease(self, timeout=None):
+        future = self._request()
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            self._abandon(future)
+            raise ProxyPoolExhausted(f"No proxy available within {timeout}s") from None
+
+    def _hand_over(self):
+        # Called with the lock held: serve waiters while proxies are available
+        while self._waiters:
+            proxy = self._take_best()
+            if proxy is None:
+                return
+            waiter = self._waiters.pop(0)
+            if not waiter.set_running_or_notify_cancel():
+                self._free.add(proxy)
+                continue
+            waiter.set_result(proxy)
+
+    def report(self, proxy, ok=True, latency=None):
+        """Record the outcome of using a proxy without releasing it."""
+        with self._lock:
+            stats = self._stats.get(proxy)
+            if stats is None:
+                return
+            if latency is not None:
+                previous = stats["latency"]
+                stats["latency"] = latency if previous is None else (
+                    self.latency_weight * latency + (1 - self.latency_weight) * previous
+                )
+            if ok:
+                stats["successes"] += 1
+                stats["failures"] = 0
+            else:
+                stats["failures"] += 1
+                if stats["failures"] >= self.quarantine_after:
+                    stats["quarantined_until"] = time.time() + self.quarantine_seconds
+                    logger.info(f"Proxy {proxy} quarantined after {stats['failures']} failures")
+
+    def release(self, proxy, ok=True, latency=None):
+        if proxy not in self._stats:
+            return
+        self.report(proxy, ok=ok, latency=latency)
+        with self._lock:
+            self._free.add(proxy)
+            self._hand_over()
+
+    def _probe(self, proxy):
+        host, port = proxy.rsplit(":", 1)
+        start = time.time()
+        try:
+            with socket.create_connection((host, int(port)), timeout=self.probe_timeout):
+                return time.time() - start
+        except OSError:
+            return None
+
+    def _probe_loop(self):
+        while not self._stopped.wait(self.probe_interval):
+            now = time.time()
+            with self._lock:
+                # Quarantines may have lapsed since the last pass
+                self._hand_over()
+                quarantined = [p for p, s in self._stats.items() if s["quarantined_until"] > now]
+            for proxy in quarantined:
+                latency = self._probe(proxy)
+                if latency is None:
+                    continue
+                with self._lock:
+                    stats = self._stats[proxy]
+                    stats["quarantined_until"] = 0
+                    stats["failures"] = self.quarantine_after - 1  # one more strike re-quarantines
+                    stats["latency"] = latency
+                    self._hand_over()
+                logger.info(f"Proxy {proxy} back in rotation ({latency:.2f}s)")
+
+    def status(self):
+        now = time.time()
+        with self._lock:
+            return [
+                {
+                    "proxy": proxy,
+                    "leased": proxy not in self._free,
+                    "quarantined": stats["quarantined_until"] > now,
+                    "latency": stats["latency"],
+                    "failures": stats["failures"],
+                    "successes": stats["successes"],
+                }
+                for proxy, stats in self._stats.items()
+            ]
@@ -1,46 +1,83 @@
-import time
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import NoSuchElementException, TimeoutException, ElementClickInterceptedException
 
-def sc_click(driver,log_func,xpath, logMessage):
-    
+# Resolves (asynchronously) once the element has no running animations, has
+# kept the same bounding box across two animation frames, and is the topmost
+# element at its centre point (i.e. no overlay or backdrop is covering it).
+# A short timer stands in for the frames when rAF is throttled.
+SETTLED_SCRIPT = """
+const el = arguments[0];
+const done = arguments[arguments.length - 1];
+const box = () => { const r = el.getBoundingClientRect(); return [r.x, r.y, r.width, r.height].join(','); };
+const first = box();
+let finished = false;
+const finish = () => {
+    if (finished) return;
+    finished = true;
+    const r = el.getBoundingClientRect();
+    const animating = (el.getAnimations ? el.getAnimations() : []).some(a => a.playState === 'running');
+    const top = document.elementFromPoint(r.x + r.width / 2, r.y + r.height / 2);
+    const uncovered = !!top && (top === el || el.contains(top) || top.contains(el));
+    done(!animating && box() === first && uncovered);
+};
+requestAnimationFrame(() => requestAnimationFrame(finish));
+setTimeout(finish, 100);
+"""
+
+# Never wait longer for the element to settle than the fixed sleep this replaced
+SETTLE_TIMEOUT = 1
+
+
+def _element_settled(element):
+    def condition(driver):
+        try:
+            return driver.execute_async_script(SETTLED_SCRIPT, element)
+        except Exception:
+            return False
+    return condition
+
+
+def click_element(driver, log_func, locator, logMessage, timeout=10):
+    """Wait for the element to be clickable and settled, then click it.
+
+    Scrolls instantly instead of smoothly and waits on real page state
+    rather than a fixed sleep; if the native click is still intercepted it
+    falls back to a JavaScript click.
+    """
+    you_hope_field_2 = None
     try:
-        # log_func("Here 21")
         # Wait for the element to be visible and interactable
-        you_hope_field_2 = WebDriverWait(driver, 10).until(
-            EC.element_to_be_clickable((By.XPATH, xpath))
+        you_hope_field_2 = WebDriverWait(driver, timeout).until(
+            EC.element_to_be_clickable(locator)
         )
-        # log_func("Here 22")
         # Scroll to the element
-        driver.execute_script("arguments[0].scrollIntoView({block: 'center', behavior: 'smooth'});", you_hope_field_2)
-        # Wait again to ensure the element is still clickable after scrolling
-        WebDriverWait(driver, 10).until(
-            EC.element_to_be_clickable((By.XPATH, xpath))
-        )
-        # log_func("Here 23")
-        # Optional: Small delay to allow any animations to settle
-        time.sleep(1)  # Reduced from 5s to 1s to minimize unnecessary wait
+        driver.execute_script("arguments[0].scrollIntoView({block: 'center', behavior: 'instant'});", you_hope_field_2)
+        try:
+            WebDriverWait(driver, SETTLE_TIMEOUT, poll_frequency=0.05).until(_element_settled(you_hope_field_2))
+        except TimeoutException:
+            # Still moving or covered; the click below (or its JS fallback) decides
+            pass
         # Attempt to click the element
         you_hope_field_2.click()
-        # log_func("Here 24")
         log_func(logMessage)
         return you_hope_field_2
 
     except ElementClickInterceptedException:
-        # log_func("Here 25")
         log_func("Click intercepted, attempting JavaScript click...")
         # Retry with JavaScript click
         driver.execute_script("arguments[0].click();", you_hope_field_2)
-        # log_func("Here 26")
         log_func("JS Click successful")
+        return you_hope_field_2
 
     except TimeoutException:
-        # log_func("Here 27")
         log_func("Element not found or not clickable within timeout")
         raise
     except Exception as e:
-        # print(f"Here 38: Unexpected error - {str(e)}")
         log_func(f"Unexpected error during click: {str(e)}")
-        raise
\ No newline at end of file
+        raise
+
+
+def sc_click(driver,log_func,xpath, logMessage):
+    return click_element(driver, log_func, (By.XPATH, xpath), logMessage)
@@ -0,0 +1,137 @@
+import asyncio
+from collections import deque
+
+PRIORITY_RETRY = 0
+PRIORITY_NEW = 1
+PRIORITY_BATCH = 2
+PRIORITY_NAMES = {"retry": PRIORITY_RETRY, "new": PRIORITY_NEW, "batch": PRIORITY_BATCH}
+
+
+class FairQueue:
+    """Waiting tickets (asyncio futures) ordered by priority class, then fairly.
+
+    pop() takes from the lowest numbered class with waiting tickets; within a
+    class, advisors take turns by stride scheduling, so an advisor with many
+    tickets queued gets its weight's share of turns rather than all of them.
+    weights maps an advisor to a relative share (default 1). Tickets that are
+    already done (cancelled waiters) are skipped.
+    """
+
+    def __init__(self, weights=None):
+        self.weights = weights or {}
+        self._queues = {priority: {} for priority in PRIORITY_NAMES.values()}  # priority -> advisor -> deque of tickets
+        self._pass = {}   # (priority, advisor) -> stride pass of the advisor's next turn
+        self._vtime = {priority: 0.0 for priority in PRIORITY_NAMES.values()}  # pass of the latest turn per class
+
+    def push(self, ticket, priority=PRIORITY_NEW, advisor=None):
+        queues = self._queues[priority]
+        if advisor not in queues:
+            # An advisor that was idle rejoins at the current turn instead of
+            # claiming the turns it did not use
+            key = (priority, advisor)
+            self._pass[key] = max(self._pass.get(key, 0.0), self._vtime[priority])
+            queues[advisor] = deque()
+        queues[advisor].append(ticket)
+
+    def pop(self):
+        """Remove and return the next live ticket, or None when there is none."""
+        for priority, queues in self._queues.items():
+            while queues:
+                advisor = min(queues, key=lambda a: self._pass[(priority, a)])
+                key = (priority, advisor)
+                waiting = queues[advisor]
+                ticket = waiting.popleft()
+                live = not ticket.done()
+                if live:
+                    self._vtime[priority] = self._pass[key]
+                    self._pass[key] += 1.0 / self.weights.get(advisor, 1.0)
+                if not waiting:
+                    del queues[advisor]
+                    self._pass.pop(key, None)
+                if live:
+                    return ticket
+        return None
+
+    def order(self):
+        """Live tickets in the order pop() would return them."""
+        ordered = []
+        for priority, queues in self._queues.items():
+            passes = {advisor: self._pass[(priority, advisor)] for advisor in queues}
+            pending = {advisor: [t for t in waiting if not t.done()] for advisor, waiting in queues.items()}
+            pending = {advisor: tickets for advisor, tickets in pending.items() if tickets}
+            while pending:
+                advisor = min(pending, key=passes.get)
+                ordered.append(pending[advisor].pop(0))
+                passes[advisor] += 1.0 / self.weights.get(advisor, 1.0)
+                if not pending[advisor]:
+                    del pending[advisor]
+        return ordered
+
+    def position(self, ticket):
+        """0-based place of ticket in the dispatch order, None once it has left."""
+        try:
+            return self.order().index(ticket)
+        except ValueError:
+            return None
+
+    def counts(self):
+        return {
+            name: sum(1 for waiting in self._queues[priority].values() for t in waiting if not t.done())
+            for name, priority in PRIORITY_NAMES.items()
+        }
+
+    def __len__(self):
+        return sum(self.counts().values())
+
+
+class FairScheduler:
+    """Runs blocking calls on the executor, at most max_running at a time.
+
+    Calls beyond that wait in a FairQueue, so a retry a user is watching
+    runs before a new proposal, a new proposal before batch work, and no
+    single advisor monopolizes the threads. All methods run on the event
+    loop.
+    """
+
+    def __init__(self, executor, max_running, weights=None):
+        self.executor = executor
+        self.max_running = max_running
+        self._waiting = FairQueue(weights)
+        self._running = 0
+
+    def _dispatch(self):
+        while self._running < self.max_running:
+            ticket = self._waiting.pop()
+            if ticket is None:
+                return
+            self._running += 1
+            ticket.set_result(None)
+
+    def _release(self):
+        self._running -= 1
+        self._dispatch()
+
+    async def run(self, func, *args, priority=PRIORITY_NEW, advisor=None):
+        """Run func(*args) on the executor once it is this call's turn."""
+        loop = asyncio.get_running_loop()
+        ticket = loop.create_future()
+        self._waiting.push(ticket, priority, advisor)
+        self._dispatch()
+        try:
+            await ticket
+        except asyncio.CancelledError:
+            # A ticket granted just before the cancellation still holds a thread
+            if ticket.done() and not ticket.cancelled():
+                self._release()
+            raise
+        try:
+            return await loop.run_in_executor(self.executor, func, *args)
+        finally:
+            self._release()
+
+    def status(self):
+        return {
+            "max_running": self.max_running,
+            "running": self._running,
+            "queued": self._waiting.counts(),
+        }
@@ -0,0 +1,96 @@
+import sqlite3
+import threading
+import time
+
+
+class MemorySessionRegistry:
+    """Session ownership for a single process: every session is local.
+
+    A registry maps a key (a session id, or "job:<id>") to the worker that
+    owns it and the address other workers reach that worker at.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def claim(self, key, owner, address):
+        with self._lock:
+            self._entries[key] = {"owner": owner, "address": address, "updated_at": time.time()}
+
+    def lookup(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            return dict(entry) if entry else None
+
+    def release(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def expire(self, ttl):
+        cutoff = time.time() - ttl
+        with self._lock:
+            expired = [key for key, entry in self._entries.items() if entry["updated_at"] < cutoff]
+            for key in expired:
+                del self._entries[key]
+        return len(expired)
+
+
+class SqliteSessionRegistry:
+    """Session ownership shared by every process that opens the same file.
+
+    Suits several hypercorn workers on one host, which reach each other
+    over per-worker unix sockets (see worker_routing.py). WAL mode lets
+    readers proceed while a worker writes; it relies on shared memory, so
+    the file must be on a local disk and not shared between hosts.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "key TEXT PRIMARY KEY, owner TEXT NOT NULL, address TEXT NOT NULL, updated_at REAL NOT NULL)"
+            )
+
+    def _connect(self):
+        # One connection per thread, as executor threads call in concurrently
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=5)
+            self._local.db = db
+        return db
+
+    def claim(self, key, owner, address):
+        with self._connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO sessions (key, owner, address, updated_at) VALUES (?, ?, ?, ?)",
+                (key, owner, address, time.time()),
+            )
+
+    def lookup(self, key):
+        row = self._connect().execute(
+            "SELECT owner, address, updated_at FROM sessions WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {"owner": row[0], "address": row[1], "updated_at": row[2]}
+
+    def release(self, key):
+        with self._connect() as db:
+            db.execute("DELETE FROM sessions WHERE key = ?", (key,))
+
+    def expire(self, ttl):
+        with self._connect() as db:
+            return db.execute("DELETE FROM sessions WHERE updated_at < ?", (time.time() - ttl,)).rowcount
+
+
+def open_registry(url):
+    """Registry for SESSION_REGISTRY: "memory" or "sqlite:///path/to/file.db"."""
+    if not url or url == "memory":
+        return MemorySessionRegistry()
+    if url.startswith("sqlite:///"):
+        return SqliteSessionRegistry(url[len("sqlite:///"):])
+    raise ValueError(f"Unsupported session registry: {url}")
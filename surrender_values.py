@@ -0,0 +1,85 @@
+import io
+import re
+import pdfplumber
+
+TOTAL_HEADER = "(A)+(B)+(C)"
+NUMBER_PATTERN = re.compile(r"^-?\d[\d,]*(\.\d+)?$")
+YEAR_PATTERN = re.compile(r"^\d{1,3}$")
+LINE_TOLERANCE = 3  # points between word tops on the same printed line
+FULL_WIDTH = str.maketrans("（）＋", "()+")
+
+
+def _lines(words):
+    """Group pdfplumber words into printed lines, top to bottom, left to right."""
+    lines = []
+    for word in sorted(words, key=lambda w: (w["top"], w["x0"])):
+        if lines and abs(lines[-1][0]["top"] - word["top"]) <= LINE_TOLERANCE:
+            lines[-1].append(word)
+        else:
+            lines.append([word])
+    return [sorted(line, key=lambda w: w["x0"]) for line in lines]
+
+
+def _header_right_edge(lines, header):
+    """Right edge of the column headed by header, which may span several words."""
+    for line in lines:
+        for start in range(len(line)):
+            joined = ""
+            for word in line[start:]:
+                joined += word["text"].translate(FULL_WIDTH)
+                if joined == header:
+                    return word["x1"]
+                if not header.startswith(joined):
+                    break
+    return None
+
+
+def _number(text):
+    return float(text.replace(",", ""))
+
+
+def parse_table_words(words, header=TOTAL_HEADER):
+    """{policy year: value in the header's column} for one page of table words.
+
+    Figures are right-aligned under their headers, so each row's value is
+    the number whose right edge is closest to the header's. Without the
+    header, the row's last figure (the total) is used.
+    """
+    lines = _lines(words)
+    right_edge = _header_right_edge(lines, header)
+    values = {}
+    for line in lines:
+        if not YEAR_PATTERN.match(line[0]["text"]):
+            continue
+        numbers = [w for w in line[1:] if NUMBER_PATTERN.match(w["text"])]
+        if not numbers:
+            continue
+        if right_edge is None:
+            cell = numbers[-1]
+        else:
+            cell = min(numbers, key=lambda w: abs(w["x1"] - right_edge))
+        values.setdefault(int(line[0]["text"]), _number(cell["text"]))
+    return values
+
+
+def parse_surrender_summary(pdf_bytes, summary_pages, header=TOTAL_HEADER):
+    """{policy year: (A)+(B)+(C) total} from the 退保價值之說明摘要 pages (0-based)."""
+    if not summary_pages:
+        return {}
+    values = {}
+    with pdfplumber.open(io.BytesIO(pdf_bytes), pages=[i + 1 for i in summary_pages]) as pdf:
+        for page in pdf.pages:
+            for year, value in parse_table_words(page.extract_words(), header).items():
+                values.setdefault(year, value)
+    return values
+
+
+def lookup_cash_values(table, years, currency_rate=None):
+    """Values at the given policy years, in HKD, or None if any year is missing.
+
+    currency_rate converts a USD table; pass None for an HKD table.
+    """
+    if any(year not in table for year in years):
+        return None
+    rate = currency_rate or 1
+    return [int(round(table[year] * rate)) for year in years]
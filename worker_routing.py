@@ -0,0 +1,194 @@
+import asyncio
+import logging
+import os
+import socket
+import time
+import httpx
+from fastapi import HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+
+logger = logging.getLogger(__name__)
+
+FORWARDED_HEADER = "X-Forwarded-By-Worker"
+HOP_HEADERS = {"host", "content-length", "connection", "transfer-encoding", "keep-alive"}
+RELAYED_HEADERS = ("content-type", "location", "retry-after", "etag", "cache-control")
+UNIX_PREFIX = "unix:"
+
+
+def worker_socket_path(directory, worker_id):
+    """Per-worker unix socket; the worker id (host:pid) keeps it unique on the host."""
+    return os.path.join(directory, worker_id.replace(":", "-").replace("/", "-") + ".sock")
+
+
+def _owner_host(owner):
+    return owner.rpartition(":")[0]
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _without_lifespan(app):
+    # The public server already ran the app's startup and shutdown hooks
+    async def wrapped(scope, receive, send):
+        if scope["type"] == "lifespan":
+            while True:
+                message = await receive()
+                if message["type"] == "lifespan.startup":
+                    await send({"type": "lifespan.startup.complete"})
+                elif message["type"] == "lifespan.shutdown":
+                    await send({"type": "lifespan.shutdown.complete"})
+                    return
+        await app(scope, receive, send)
+    return wrapped
+
+
+async def serve_worker_socket(app, path, shutdown_event):
+    """Serve app on this worker's own unix socket until shutdown_event is set.
+
+    hypercorn --workers shares one bind between all workers, so this is
+    what lets other workers on the host reach this particular one.
+    """
+    from hypercorn.asyncio import serve
+    from hypercorn.config import Config
+    if os.path.exists(path):
+        os.unlink(path)
+    config = Config()
+    config.bind = [f"{UNIX_PREFIX}{path}"]
+    config.accesslog = None
+    try:
+        await serve(_without_lifespan(app), config, shutdown_trigger=shutdown_event.wait)
+    finally:
+        if os.path.exists(path):
+            os.unlink(path)
+
+
+class WorkerRouter:
+    """Sends requests for a session to the worker that owns its driver.
+
+    Ownership lives in a session registry (see session_registry.py) shared
+    by the workers of one host. A worker's address is either "unix:<socket
+    path>" or an http URL on its own port. An entry owned by another host
+    means the registry was shared beyond what it supports and is ignored.
+    A request that was already forwarded once is always served locally, so
+    a stale registry entry cannot bounce a request between workers. When the
+    owner cannot be reached its entry is dropped and the session reported
+    as gone.
+    """
+
+    def __init__(self, registry, worker_id, address, timeout=600):
+        self.registry = registry
+        self.worker_id = worker_id
+        self.address = address
+        self.timeout = timeout
+        self._clients = {}  # address -> httpx.AsyncClient
+
+    def _client_for(self, address):
+        """(client, base URL) for reaching the worker at address."""
+        if address not in self._clients:
+            timeout = httpx.Timeout(self.timeout, connect=5)
+            if address.startswith(UNIX_PREFIX):
+                transport = httpx.AsyncHTTPTransport(uds=address[len(UNIX_PREFIX):])
+                self._clients[address] = httpx.AsyncClient(transport=transport, timeout=timeout)
+            else:
+                self._clients[address] = httpx.AsyncClient(timeout=timeout)
+        base = "http://worker" if address.startswith(UNIX_PREFIX) else address.rstrip("/")
+        return self._clients[address], base
+
+    async def _call(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+    async def claim(self, key):
+        """Record this worker as the owner of key, or refresh its timestamp."""
+        await self._call(self.registry.claim, key, self.worker_id, self.address)
+
+    async def release(self, key):
+        await self._call(self.registry.release, key)
+
+    async def check_address(self, heartbeat_ttl):
+        """Claim this worker's address, failing if a live worker elsewhere holds it.
+
+        Another live process on this host with the same address means
+        WORKER_URL was shared, e.g. by hypercorn --workers, and forwarded
+        requests would land on a random worker. A recent claim from another
+        host (a previous container sharing the registry file, say) can't be
+        checked for liveness and is only logged.
+        """
+        key = f"worker:{self.address}"
+        entry = await self._call(self.registry.lookup, key)
+        if entry and entry["owner"] != self.worker_id and time.time() - entry["updated_at"] < heartbeat_ttl:
+            host, _, pid = entry["owner"].rpartition(":")
+            if host == socket.gethostname() and pid.isdigit() and _pid_alive(int(pid)):
+                raise RuntimeError(
+                    f"Worker address {self.address} is already used by worker {entry['owner']}; "
+                    "give every worker its own WORKER_URL or leave it unset to use per-worker sockets"
+                )
+            logger.error(f"Worker address {self.address} was claimed by {entry['owner']} "
+                         f"{time.time() - entry['updated_at']:.0f}s ago")
+        await self.claim(key)
+
+    async def owner_address(self, request: Request, key):
+        """Address of the worker owning key, or None to serve it here."""
+        if request.headers.get(FORWARDED_HEADER):
+            return None
+        entry = await self._call(self.registry.lookup, key)
+        if not entry or entry["owner"] == self.worker_id:
+            return None
+        if _owner_host(entry["owner"]) != socket.gethostname():
+            logger.error(f"{key} is owned by {entry['owner']} on another host; the registry is per host")
+            return None
+        return entry["address"]
+
+    def _outgoing(self, request: Request, address):
+        client, base = self._client_for(address)
+        url = base + request.url.path
+        if request.url.query:
+            url += "?" + request.url.query
+        headers = {name: value for name, value in request.headers.items() if name.lower() not in HOP_HEADERS}
+        headers[FORWARDED_HEADER] = self.worker_id
+        return client, url, headers
+
+    async def _owner_gone(self, key, address, error):
+        logger.error(f"Owner {address} of {key} unreachable: {str(error)}")
+        await self.release(key)
+        raise HTTPException(status_code=404, detail="Session not found")
+
+    async def forward(self, request: Request, key, address):
+        client, url, headers = self._outgoing(request, address)
+        try:
+            response = await client.request(request.method, url, content=await request.body(), headers=headers)
+        except httpx.TransportError as e:
+            await self._owner_gone(key, address, e)
+        relayed = {name: response.headers[name] for name in RELAYED_HEADERS if name in response.headers}
+        return Response(content=response.content, status_code=response.status_code, headers=relayed)
+
+    async def forward_stream(self, request: Request, key, address):
+        client, url, headers = self._outgoing(request, address)
+        try:
+            # Log streams stay open as long as the session does
+            outgoing = client.build_request(request.method, url, headers=headers,
+                                            timeout=httpx.Timeout(None, connect=5))
+            response = await client.send(outgoing, stream=True)
+        except httpx.TransportError as e:
+            await self._owner_gone(key, address, e)
+
+        async def relay():
+            try:
+                async for chunk in response.aiter_raw():
+                    yield chunk
+            finally:
+                await response.aclose()
+
+        return StreamingResponse(relay(), status_code=response.status_code,
+                                 media_type=response.headers.get("content-type"))
+
+    async def aclose(self):
+        clients, self._clients = self._clients, {}
+        for client in clients.values():
+            await client.aclose()